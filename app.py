@@ -1,30 +1,185 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, Response
 import sqlite3, os, math
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from ml_recommender import FitnessRecommender
 from dynamic_adjuster import DynamicAdjuster
+from cache import SnapshotCache, ProfileCache, create_store
+from db import config_from_env, create_pool
+from migrations import run_migrations
+import rollups
+from leaderboard import Leaderboard
+import points
+import challenge_engine
+from hashing import PasswordHasher, HashingBusy
+from records import WorkoutRecord, DietRecord, ScheduleRecord, UserProfile
+import nightly_adjust
+from model_store import ModelStore, data_fingerprint
+from training_queue import TrainingQueue, load_training_data
+from history_export import EXPORT_FORMATS, EXPORT_TABLES, MIMETYPES, resolve_tables, export_chunks
+from history_import import FORMATS, KINDS, detect_format, iter_records, import_history
+from wearable_ingest import parse_reading, validate_batch, insert_readings, iter_ndjson
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET','dev_secret')
 
 USE_MYSQL = os.environ.get('USE_MYSQL','false').lower() == 'true'
-DB_PATH = os.path.join(os.path.dirname(__file__), 'data.db')
+DB_PATH = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'data.db'))
+# SQLite by default; USE_MYSQL=true switches every query to a pooled pymysql backend
+db_config = config_from_env(DB_PATH)
+db_pool = create_pool(db_config)
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(os.path.dirname(__file__), 'models'))
 
 # Initialize ML components
-ml_recommender = FitnessRecommender()
+model_store = ModelStore(MODEL_DIR, max_in_memory=int(os.environ.get('MODEL_CACHE_SIZE', '128')),
+                         max_bytes=int(os.environ.get('MODEL_CACHE_MB', '64')) * 1024 * 1024)
+# TRAINING_WORKERS=0 trains inline on the request thread (useful when debugging)
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', str(os.cpu_count() or 1)))
+training_queue = TrainingQueue(model_store, db_config, max_workers=TRAINING_WORKERS)
 dynamic_adjuster = DynamicAdjuster()
+WEARABLE_BATCH_MAX = int(os.environ.get('WEARABLE_BATCH_MAX', '10000'))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+LEADERBOARD_PAGE_SIZE = 10
+# PBKDF2 runs in its own small pool; when HASHING_WORKERS + HASHING_QUEUE hashes are outstanding, logins get a fast 503
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+    max_workers=int(os.environ.get('HASHING_WORKERS', '2')),
+    max_pending=int(os.environ.get('HASHING_QUEUE', '32')))
+CHALLENGES_PAGE_SIZE = 20
+
+# Sorted in-memory points index; reloaded after LEADERBOARD_TTL seconds to pick up other workers' writes
+leaderboard = Leaderboard(ttl=int(os.environ.get('LEADERBOARD_TTL', '60')))
+
+# Dashboard snapshots; DASHBOARD_CACHE=sqlite:/path/cache.db shares them between worker processes
+dashboard_cache = SnapshotCache(
+    create_store(os.environ.get('DASHBOARD_CACHE', 'memory'), max_entries=int(os.environ.get('DASHBOARD_CACHE_SIZE', '1024'))),
+    'dashboard', ttl=int(os.environ.get('DASHBOARD_CACHE_TTL', '60')))
+
+# User profiles (no credentials), checked against the profile_version stamp in the session
+profile_cache = ProfileCache(
+    create_store(os.environ.get('PROFILE_CACHE', 'memory'), max_entries=int(os.environ.get('PROFILE_CACHE_SIZE', '4096'))),
+    ttl=int(os.environ.get('PROFILE_CACHE_TTL', '300')))
+
+def migrate_database():
+    """Bring the schema up to date; versions already applied are skipped"""
+    with db_pool.connection() as conn:
+        return run_migrations(conn, db_pool.dialect)
+
+# Schema changes run once per process at startup, never inside request handlers
+_new_database = not USE_MYSQL and not os.path.exists(DB_PATH)
+if os.environ.get('AUTO_MIGRATE', 'true').lower() == 'true':
+    migrate_database()
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations"""
+    applied = migrate_database()
+    print(f"Applied migrations: {applied}" if applied else "Database schema is up to date")
+
+@app.cli.command('import-history')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'user_id', type=int, required=True, help='Id of the user the history belongs to')
+@click.option('--kind', type=click.Choice(sorted(KINDS)), required=True)
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None, help='Defaults to the file extension')
+@click.option('--chunk-size', type=int, default=5000)
+def import_history_command(path, user_id, kind, fmt, chunk_size):
+    """Stream a CSV/NDJSON workout or diet export into the database"""
+    def report(chunk):
+        print(f"chunk {chunk['chunk']}: {chunk['inserted']}/{chunk['rows']} rows in {chunk['seconds']}s ({chunk['rows_per_sec']} rows/s)")
+    with open(path, 'rb') as f, db_pool.connection() as conn:
+        summary = import_history(conn, user_id, kind, iter_records(f, fmt or detect_format(path)),
+                                 chunk_size=chunk_size, progress=report)
+    dashboard_cache.invalidate(user_id)
+    for error in summary['errors']:
+        print(f"row {error['row']}: {error['error']}")
+    print(f"Imported {summary['inserted']} of {summary['rows']} {kind} rows ({summary['invalid']} invalid) "
+          f"in {summary['seconds']}s, {summary['rows_per_sec']} rows/s")
+    if not summary['inserted']:
+        return
+    with db_pool.connection() as conn:
+        if kind == 'workout':
+            print(f"Challenges completed: {update_challenges(conn, user_id)}")
+        profile, workout_list, diet_list = load_training_data(conn, user_id)
+        fingerprint = data_fingerprint(conn, user_id, profile) if profile else None
+    # The command exits right away, so fit the models here rather than in the background queue
+    if profile and len(workout_list) >= 3:
+        def train():
+            candidate = FitnessRecommender()
+            return candidate if candidate.train_models(workout_list, diet_list, profile) else None
+        trained = model_store.get_or_train(user_id, fingerprint, train)
+        print("Recommender models trained" if trained else "Not enough varied data to train recommender models")
+
+@app.cli.command('export-history')
+@click.option('--user', 'user_id', type=int, required=True, help='Id of the user to export')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson')
+@click.option('--table', 'tables', type=click.Choice(sorted(EXPORT_TABLES)), multiple=True,
+              help='Repeat to pick tables (default: all; CSV takes exactly one)')
+@click.option('--output', '-o', type=click.File('w'), default='-')
+def export_history_command(user_id, fmt, tables, output):
+    """Stream a user's history as NDJSON or CSV"""
+    try:
+        tables = resolve_tables(fmt, tables)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    with db_pool.connection() as conn:
+        for chunk in export_chunks(conn, user_id, fmt, tables):
+            output.write(chunk)
+
+@app.cli.command('adjust-schedules')
+@click.option('--chunk-size', type=int, default=nightly_adjust.CHUNK_SIZE, help='Users per chunk')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU, 0 = inline)')
+def adjust_schedules_command(chunk_size, workers):
+    """Nightly job: apply skip/sleep/recovery adjustments to every user's pending schedule"""
+    def report(chunk):
+        print(f"chunk of {chunk['users']} users: {chunk['adjusted']} workouts adjusted in {chunk['seconds']}s")
+    with db_pool.connection() as conn:
+        totals = nightly_adjust.run(conn, db_config, chunk_size=chunk_size, workers=workers, progress=report)
+    print(f"Adjusted {totals['adjusted']} workouts ({totals['rest_days']} rest days, {totals['skipped']} skipped "
+          f"workouts found) for {totals['users']} users in {totals['seconds']}s, {totals['users_per_sec']} users/s")
+
+@app.cli.command('compact-points')
+@click.option('--days', type=int, default=90, help='Fold ledger rows older than this many days')
+@click.option('--batch-size', type=int, default=points.COMPACT_BATCH_SIZE, help='Users per transaction')
+def compact_points_command(days, batch_size):
+    """Fold old points_events rows into one balance row per user"""
+    with db_pool.connection() as conn:
+        totals = points.compact(conn, older_than_days=days, batch_size=batch_size)
+    print(f"Compacted {totals['events_removed']} ledger rows for {totals['users']} users in {totals['batches']} batches")
+
+@app.cli.command('evaluate-challenges')
+def evaluate_challenges_command():
+    """Periodic job: update every active challenge's progress, pay out completions, expire closed ones"""
+    with db_pool.connection() as conn:
+        result = challenge_engine.evaluate(conn)
+        conn.commit()
+    print(f"Evaluated {result['evaluated']} challenge entries: {result['completed']} completed, "
+          f"{result['expired']} expired, {result['updated']} updated")
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        # For demo we use sqlite fallback
-        db = g._database = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
+        # Connections are reused across requests (SQLite, or MySQL when USE_MYSQL=true)
+        db = g._database = db_pool.acquire()
     return db
 
+def load_profile(db, uid):
+    rows = db.execute(f"SELECT {', '.join(UserProfile.FIELDS)} FROM users WHERE id = ?", (uid,)).fetchall()
+    return UserProfile.from_rows(rows)[0] if rows else None
+
+def current_profile(db=None):
+    """
+    The logged-in user's UserProfile, read at most once per request and usually not at all
+    The session's profile_version stamp decides whether the cached copy is current.
+    """
+    if 'profile' not in g:
+        uid = session['user_id']
+        g.profile = profile_cache.get(uid, session.get('profile_version'), lambda: load_profile(db or get_db(), uid))
+        if g.profile is not None and session.get('profile_version') != g.profile.profile_version:
+            session['profile_version'] = g.profile.profile_version
+    return g.profile
+
 def init_db():
     db = get_db()
     with open(os.path.join(os.path.dirname(__file__), 'sql', 'sqlite_schema.sql'),'r') as f:
@@ -47,77 +202,26 @@ def init_db():
             )
         )
 
-def check_and_create_tables():
-    """Check if new tables exist, create them if missing (migration)"""
-    # Use direct connection, not Flask's g context (for startup use)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # Check if workout_schedule table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='workout_schedule'")
-        if not cursor.fetchone():
-            print("Creating missing table: workout_schedule")
-            cursor.execute('''
-                CREATE TABLE workout_schedule (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    scheduled_date DATE,
-                    workout_type TEXT,
-                    duration_min INTEGER,
-                    status TEXT DEFAULT 'pending',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-            ''')
-        
-        # Check if challenges table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='challenges'")
-        if not cursor.fetchone():
-            print("Creating missing table: challenges")
-            cursor.execute('''
-                CREATE TABLE challenges (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT,
-                    description TEXT,
-                    start_date DATE,
-                    end_date DATE,
-                    target_metric TEXT,
-                    target_value REAL,
-                    points_reward INTEGER,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-        
-        # Check if user_challenges table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user_challenges'")
-        if not cursor.fetchone():
-            print("Creating missing table: user_challenges")
-            cursor.execute('''
-                CREATE TABLE user_challenges (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    challenge_id INTEGER,
-                    progress_value REAL DEFAULT 0,
-                    status TEXT DEFAULT 'active',
-                    joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (challenge_id) REFERENCES challenges(id) ON DELETE CASCADE
-                )
-            ''')
-        
-        conn.commit()
-    except Exception as e:
-        print(f"Error creating tables: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
-        db.close()
+        db_pool.release(db)
+
+@app.route('/admin/stats')
+def admin_stats():
+    # Operational counters for sizing pools and caches; off unless EXPOSE_STATS=true
+    if os.environ.get('EXPOSE_STATS', 'false').lower() != 'true':
+        return 'Not found', 404
+    return jsonify({
+        'db_pool': db_pool.stats(),
+        'model_store': model_store.stats(),
+        'dashboard_cache': dashboard_cache.stats(),
+        'profile_cache': profile_cache.stats(),
+        'leaderboard': leaderboard.stats(),
+        'password_hasher': password_hasher.stats(),
+        'training_queue': {'pending': training_queue.pending(), 'trained': training_queue.trained}
+    })
 
 @app.route('/')
 def index():
@@ -132,7 +236,11 @@ def signup():
         db = get_db()
         if db.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone():
             flash('Email already registered','danger'); return redirect(url_for('signup'))
-        pwd_hash = generate_password_hash(password)
+        try:
+            pwd_hash = password_hasher.hash(password)
+        except HashingBusy:
+            flash('Too many sign-ups right now, please try again in a moment','danger')
+            return render_template('signup.html'), 503
         db.execute('INSERT INTO users (name,email,password_hash) VALUES (?,?,?)',(name,email,pwd_hash))
         db.commit()
         flash('Account created. Please login.','success'); return redirect(url_for('login'))
@@ -143,62 +251,61 @@ def login():
     if request.method=='POST':
         email = request.form['email']; password = request.form['password']
         db = get_db(); row = db.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        if row and check_password_hash(row['password_hash'], password):
+        try:
+            valid = row is not None and password_hasher.verify(row['password_hash'], password)
+        except HashingBusy:
+            flash('Too many sign-ins right now, please try again in a moment','danger')
+            return render_template('login.html'), 503
+        if valid:
+            if password_hasher.needs_rehash(row['password_hash']):
+                upgrade_password_hash(db, row['id'], row['password_hash'], password)
             session['user_id'] = row['id']; session['name'] = row['name']
+            # The row is already here: stamp the session and prime the cache, so the dashboard reads no profile
+            session['profile_version'] = row['profile_version']
+            profile_cache.put(row['id'], UserProfile.from_rows([row])[0])
             flash('Logged in','success'); return redirect(url_for('dashboard'))
         flash('Invalid credentials','danger'); return redirect(url_for('login'))
     return render_template('login.html')
 
+def upgrade_password_hash(db, uid, old_hash, password):
+    """Re-hash with the current parameters after a successful login (skipped if the pool is busy)"""
+    try:
+        new_hash = password_hasher.hash(password)
+    except HashingBusy:
+        return  # tried again on the next login
+    # Only replace the hash that was verified, in case the password changed meanwhile
+    if db.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                  (new_hash, uid, old_hash)).rowcount:
+        password_hasher.rehashed()
+    db.commit()
+
 @app.route('/logout')
 def logout():
     session.clear(); flash('Logged out','info'); return redirect(url_for('index'))
 
-def ensure_tables():
-    """Ensure all required tables exist (called once at startup)"""
-    if os.path.exists(DB_PATH):
-        try:
-            check_and_create_tables()
-            print("✅ Database tables verified/created successfully")
-        except Exception as e:
-            print(f"⚠️ Table check error: {e}")
-            # Try again with direct connection
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                # Create challenges table if missing
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='challenges'")
-                if not cursor.fetchone():
-                    cursor.execute('''
-                        CREATE TABLE challenges (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            name TEXT,
-                            description TEXT,
-                            start_date DATE,
-                            end_date DATE,
-                            target_metric TEXT,
-                            target_value REAL,
-                            points_reward INTEGER,
-                            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                        )
-                    ''')
-                conn.commit()
-                conn.close()
-                print("✅ Missing tables created successfully")
-            except Exception as e2:
-                print(f"❌ Failed to create tables: {e2}")
-
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session: return redirect(url_for('login'))
-    db = get_db(); uid = session['user_id']
-    user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
+    uid = session['user_id']
+    snapshot = dashboard_cache.get_or_build(uid, lambda: build_dashboard_snapshot(get_db(), uid, current_profile()))
+    return render_template('dashboard.html', **snapshot)
+
+def build_dashboard_snapshot(db, uid, profile):
+    """Everything the dashboard shows, as plain dicts so it can be cached"""
     workouts = db.execute('SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC LIMIT 6', (uid,)).fetchall()
     diets = db.execute('SELECT * FROM diet WHERE user_id = ? ORDER BY date DESC LIMIT 6', (uid,)).fetchall()
     progress = db.execute('SELECT * FROM progress WHERE user_id = ? ORDER BY date DESC LIMIT 6', (uid,)).fetchall()
     community = db.execute('SELECT * FROM community WHERE user_id = ?', (uid,)).fetchone()
     # prepare stats for charts
-    steps = db.execute('SELECT recorded_at, steps FROM wearabled WHERE user_id = ? ORDER BY recorded_at DESC LIMIT 7', (uid,)).fetchall()
-    return render_template('dashboard.html', user=user, workouts=workouts, diets=diets, progress=progress, community=community, steps=steps)
+    steps = rollups.daily_steps(db, uid)
+    return {
+        'user': profile.to_dict() if profile else None,  # UserProfile never carries credentials
+        'workouts': [dict(w) for w in workouts],
+        'diets': [dict(d) for d in diets],
+        'progress': [dict(p) for p in progress],
+        'community': dict(community) if community else None,
+        'steps': steps
+    }
 
 @app.route('/edit_profile', methods=['GET','POST'])
 def edit_profile():
@@ -235,17 +342,21 @@ def edit_profile():
         
         if update_fields:
             params.append(uid)
-            query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
+            query = f"UPDATE users SET {', '.join(update_fields)}, profile_version = profile_version + 1 WHERE id = ?"
             db.execute(query, params)
             db.commit()
+            dashboard_cache.invalidate(uid)
+            # Drop the old copy and re-stamp the session, so no worker serves the previous version
+            profile_cache.invalidate(uid)
+            session.pop('profile_version', None); g.pop('profile', None)
+            current_profile(db)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('dashboard'))
         else:
             flash('No changes made', 'info')
     
     # GET request - show edit form
-    user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-    return render_template('edit_profile.html', user=user)
+    return render_template('edit_profile.html', user=current_profile(db))
 
 @app.route('/add_workout', methods=['GET','POST'])
 def add_workout():
@@ -256,6 +367,10 @@ def add_workout():
         db = get_db()
         db.execute('INSERT INTO workout (user_id,date,workout_type,duration_min,calories_burned,notes) VALUES (?,?,?,?,?,?)',
                    (uid,date,wtype,duration,calories,notes)); db.commit()
+        dashboard_cache.invalidate(uid)
+        training_queue.enqueue(uid)
+        if update_challenges(db, uid):
+            flash('Challenge completed! Reward points added','success')
         flash('Workout added','success'); return redirect(url_for('dashboard'))
     return render_template('add_workout.html')
 
@@ -269,81 +384,184 @@ def add_diet():
         db = get_db()
         db.execute('INSERT INTO diet (user_id,date,meal_type,calories,protein_g,carbs_g,fats_g,notes) VALUES (?,?,?,?,?,?,?,?)',
                    (uid,date,meal,calories,protein,carbs,fats,notes)); db.commit()
+        dashboard_cache.invalidate(uid)
+        training_queue.enqueue(uid)
         flash('Diet entry added','success'); return redirect(url_for('dashboard'))
     return render_template('add_diet.html')
 
+@app.route('/import', methods=['GET','POST'])
+def import_data():
+    if 'user_id' not in session: return redirect(url_for('login'))
+    if request.method=='POST':
+        uid = session['user_id']; upload = request.files.get('file'); kind = request.form.get('kind')
+        if not upload or not upload.filename or kind not in KINDS:
+            flash('Choose a file and what it contains','danger'); return redirect(url_for('import_data'))
+        # Werkzeug spools large uploads to disk; rows are read from it lazily
+        summary = import_history(get_db(), uid, kind, iter_records(upload.stream, detect_format(upload.filename)))
+        if summary['inserted']:
+            dashboard_cache.invalidate(uid)
+            training_queue.enqueue(uid)
+            if kind == 'workout' and update_challenges(get_db(), uid):
+                flash('Challenge completed! Reward points added','success')
+        for error in summary['errors'][:5]:
+            flash(f"Row {error['row']}: {error['error']}",'danger')
+        flash(f"Imported {summary['inserted']} of {summary['rows']} {kind} rows ({summary['invalid']} invalid)",'success')
+        return redirect(url_for('dashboard'))
+    return render_template('import.html')
+
+@app.route('/export')
+def export_data():
+    if 'user_id' not in session: return redirect(url_for('login'))
+    uid = session['user_id']; fmt = request.args.get('format', 'ndjson')
+    try:
+        tables = resolve_tables(fmt, request.args.getlist('table'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    def generate():
+        # The body is produced after the request's teardown, so it holds its own pooled connection
+        with db_pool.connection() as conn:
+            yield from export_chunks(conn, uid, fmt, tables)
+    name = tables[0] if len(tables) == 1 else 'history'
+    return Response(generate(), mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=fitplanner-{name}.{fmt}'})
+
 @app.route('/wearable', methods=['GET','POST'])
 def wearable():
     if 'user_id' not in session: return redirect(url_for('login'))
     if request.method=='POST':
-        uid = session['user_id']; recorded_at = request.form['recorded_at']; steps = int(request.form['steps'] or 0)
-        hr = int(request.form['heart_rate'] or 0); sleep = float(request.form['sleep_hours'] or 0); calories = int(request.form['calories_burned'] or 0)
-        db = get_db(); db.execute('INSERT INTO wearabled (user_id,recorded_at,steps,heart_rate,sleep_hours,calories_burned) VALUES (?,?,?,?,?,?)',
-                                  (uid,recorded_at,steps,hr,sleep,calories)); db.commit()
+        uid = session['user_id']
+        try:
+            reading = parse_reading(request.form.to_dict())
+        except ValueError as e:
+            flash(f'Invalid reading: {e}','danger'); return redirect(url_for('wearable'))
+        db = get_db()
+        if not insert_readings(db, uid, [reading]):
+            flash('A reading for that time is already saved','info'); return redirect(url_for('dashboard'))
+        dashboard_cache.invalidate(uid)
+        if update_challenges(db, uid):
+            flash('Challenge completed! Reward points added','success')
         
         # Trigger automatic adjustment based on wearable data
-        try:
-            # Get recent sleep data
-            sleep_data = db.execute('SELECT sleep_hours FROM wearabled WHERE user_id = ? AND sleep_hours > 0 ORDER BY recorded_at DESC LIMIT 7', (uid,)).fetchall()
-            sleep_records = [{'sleep_hours': s['sleep_hours']} for s in sleep_data]
-            sleep_quality = dynamic_adjuster.analyze_sleep_quality(sleep_records)
-            
+        message = apply_wearable_adjustment(db, uid)
+        if message:
+            flash(f"⚠️ Schedule adjusted: {message}", 'info')
+        
+        flash('Wearable data saved','success'); return redirect(url_for('dashboard'))
+    return render_template('wearable.html')
+
+@app.route('/api/wearable/batch', methods=['POST'])
+def wearable_batch():
+    """Device sync: a JSON array or NDJSON stream of readings, stored in one transaction"""
+    if 'user_id' not in session: return jsonify({'error': 'login required'}), 401
+    uid = session['user_id']
+    if request.mimetype in NDJSON_MIMETYPES:
+        records = iter_ndjson(request.stream)
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return jsonify({'error': 'expected a JSON array or an NDJSON body'}), 400
+    try:
+        rows, result = validate_batch(records, WEARABLE_BATCH_MAX)
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    
+    db = get_db()
+    inserted = insert_readings(db, uid, rows)
+    result['duplicates'] += len(rows) - inserted
+    result['inserted'] = inserted
+    result['challenges_completed'] = 0
+    result['adjustment'] = None
+    if inserted:
+        # Cache invalidation and schedule adjustment run once per batch, not once per reading
+        dashboard_cache.invalidate(uid)
+        result['challenges_completed'] = update_challenges(db, uid)
+        result['adjustment'] = apply_wearable_adjustment(db, uid)
+    return jsonify(result)
+
+def update_challenges(db, uid):
+    """
+    Re-evaluate the user's active challenges after new activity (commits)
+    Returns:
+        Number of challenges completed (and paid out) by this update
+    """
+    result = challenge_engine.evaluate(db, [uid])
+    db.commit()
+    for user_id, total in result['payouts']:
+        leaderboard.record(user_id, total)
+    if result['payouts']:
+        dashboard_cache.invalidate(uid)
+    return result['completed']
+
+def apply_wearable_adjustment(db, uid):
+    """
+    Shorten the next pending workout when recent sleep is poor
+    Returns:
+        Adjustment message if the schedule was changed, else None
+    """
+    try:
+        # Get recent sleep data
+        sleep_quality = rollups.sleep_quality(db, uid) or dynamic_adjuster.analyze_sleep_quality([])
+        
+        # Auto-adjust if sleep quality is poor
+        if sleep_quality.get('score', 1.0) < 0.6:
             # Get schedule
             schedule = db.execute('SELECT * FROM workout_schedule WHERE user_id = ? AND status = ? ORDER BY scheduled_date', (uid, 'pending')).fetchall()
-            schedule_list = [dict(s) for s in schedule]
+            schedule_list = ScheduleRecord.from_rows(schedule)
             
-            # Get workouts
-            workouts = db.execute('SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC LIMIT 10', (uid,)).fetchall()
-            workout_list = [dict(w) for w in workouts]
+            adjustment = dynamic_adjuster.adjust_workout_schedule(
+                current_profile(db), {'skipped': [], 'adherence_rate': 1.0}, 
+                sleep_quality, schedule_list, {}
+            )
             
-            # Auto-adjust if sleep quality is poor
-            if sleep_quality.get('score', 1.0) < 0.6:
-                user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-                user_dict = dict(user)
-                
-                adjustment = dynamic_adjuster.adjust_workout_schedule(
-                    user_dict, {'skipped': [], 'adherence_rate': 1.0}, 
-                    sleep_quality, schedule_list, {}
-                )
-                
-                # Update next scheduled workout if adjustment recommended
-                if adjustment.get('adjustments'):
-                    next_schedule = db.execute('SELECT * FROM workout_schedule WHERE user_id = ? AND status = ? AND scheduled_date >= date("now") ORDER BY scheduled_date LIMIT 1', (uid, 'pending')).fetchone()
-                    if next_schedule:
-                        if 'reduce_intensity' in [a.get('type') for a in adjustment['adjustments']]:
-                            new_duration = max(15, int(next_schedule['duration_min'] * 0.7))
-                            db.execute('UPDATE workout_schedule SET duration_min = ? WHERE id = ?', (new_duration, next_schedule['id']))
-                            db.commit()
-                            flash(f"⚠️ Schedule adjusted: {adjustment['adjustments'][0].get('message', 'Workout intensity reduced due to poor sleep quality')}", 'info')
-        except Exception as e:
-            print(f"Adjustment error: {e}")  # Don't break if adjustment fails
-        
-        flash('Wearable data saved','success'); return redirect(url_for('dashboard'))
-    return render_template('wearable.html')
+            # Update next scheduled workout if adjustment recommended
+            if adjustment.get('adjustments'):
+                next_schedule = db.execute('SELECT * FROM workout_schedule WHERE user_id = ? AND status = ? AND scheduled_date >= date("now") ORDER BY scheduled_date LIMIT 1', (uid, 'pending')).fetchone()
+                # Already shortened (here or by the nightly job): don't shrink it again
+                if next_schedule and not next_schedule['adjusted_on']:
+                    if 'reduce_intensity' in [a.get('type') for a in adjustment['adjustments']]:
+                        new_duration = max(15, int(next_schedule['duration_min'] * 0.7))
+                        db.execute('UPDATE workout_schedule SET duration_min = ?, adjusted_on = ?, adjustment_note = ? WHERE id = ?',
+                                   (new_duration, datetime.now().date().isoformat(), 'Intensity reduced due to poor sleep quality', next_schedule['id']))
+                        db.commit()
+                        return adjustment['adjustments'][0].get('message', 'Workout intensity reduced due to poor sleep quality')
+    except Exception as e:
+        print(f"Adjustment error: {e}")  # Don't break if adjustment fails
+    return None
 
 @app.route('/recommendations')
 def recommendations():
     if 'user_id' not in session: return redirect(url_for('login'))
-    db = get_db(); uid = session['user_id']; user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-    user_dict = dict(user)
+    db = get_db(); uid = session['user_id']; user = user_dict = current_profile(db)
     
     # Get workout and diet history for ML training
     workouts = db.execute('SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC LIMIT 50', (uid,)).fetchall()
     diets = db.execute('SELECT * FROM diet WHERE user_id = ? ORDER BY date DESC LIMIT 50', (uid,)).fetchall()
-    workout_list = [dict(w) for w in workouts]
-    diet_list = [dict(d) for d in diets]
-    
-    # Train ML models if we have enough data
-    ml_used = False
-    if len(workout_list) >= 3:
-        ml_used = ml_recommender.train_models(workout_list, diet_list, user_dict)
+    workout_list = WorkoutRecord.from_rows(workouts)
+    diet_list = DietRecord.from_rows(diets)
+    
+    # Reuse the user's trained models; refits happen in the background training queue
+    fingerprint = data_fingerprint(db, uid, user_dict)
+    def train():
+        candidate = FitnessRecommender()
+        return candidate if candidate.train_models(workout_list, diet_list, user_dict) else None
+
+    if len(workout_list) < 3:
+        ml_recommender = None
+    elif TRAINING_WORKERS == 0:
+        ml_recommender = model_store.get_or_train(uid, fingerprint, train)
+    else:
+        # Serve the last published model (or the rule-based fallback) while a fresh one trains
+        published_fingerprint, ml_recommender = model_store.latest(uid)
+        if published_fingerprint != fingerprint:
+            training_queue.enqueue(uid, fingerprint)
+    ml_used = ml_recommender is not None
     
     # Get recommendations (ML-based if trained, else fallback)
     if ml_used:
         # Get recent activity for prediction
         last_workout = workout_list[0] if workout_list else None
         recent_activity = {
-            'days_since_last_workout': (datetime.now().date() - datetime.strptime(last_workout['date'], '%Y-%m-%d').date()).days if last_workout else 1,
+            'days_since_last_workout': (datetime.now().date() - last_workout.day).days if last_workout and last_workout.day else 1,
             'last_workout_type': last_workout.get('workout_type') if last_workout else None
         }
         
@@ -375,13 +593,12 @@ def recommendations():
     recent = db.execute('SELECT workout_type,count(*) as cnt FROM workout WHERE user_id = ? GROUP BY workout_type ORDER BY cnt DESC LIMIT 3',(uid,)).fetchall()
     
     # Get dynamic adjustments info
-    schedule = db.execute('SELECT * FROM workout_schedule WHERE user_id = ? ORDER BY scheduled_date', (uid,)).fetchall()
-    schedule_list = [dict(s) for s in schedule]
-    skipped = dynamic_adjuster.detect_skipped_workouts(schedule_list, workout_list)
+    skipped = dynamic_adjuster.detect_skipped_workouts_db(db, uid)
     
-    sleep_data = db.execute('SELECT sleep_hours FROM wearabled WHERE user_id = ? AND sleep_hours > 0 ORDER BY recorded_at DESC LIMIT 7', (uid,)).fetchall()
-    sleep_records = [{'sleep_hours': s['sleep_hours']} for s in sleep_data]
-    sleep_quality = dynamic_adjuster.analyze_sleep_quality(sleep_records) if sleep_data else {'quality': 'unknown', 'score': 0.8}
+    sleep_quality = rollups.sleep_quality(db, uid) or {'quality': 'unknown', 'score': 0.8}
+    
+    # Protein (and calories after poor sleep) follow this week's wearable activity, if any
+    suggestions = dynamic_adjuster.adjust_diet_plan(user_dict, rollups.weekly_activity(db, uid), sleep_quality, suggestions)
     
     return render_template('recommendations.html', user=user, suggestions=suggestions, recent=recent, 
                          skipped=skipped, sleep_quality=sleep_quality, ml_used=ml_used)
@@ -389,42 +606,37 @@ def recommendations():
 @app.route('/community')
 def community():
     if 'user_id' not in session: return redirect(url_for('login'))
-    # Ensure tables exist before querying
-    try:
-        check_and_create_tables()
-    except:
-        pass
-    
     db=get_db(); uid=session['user_id']
-    # leaderboard: top 10 by points
-    leaderboard = db.execute('SELECT u.name,c.points FROM community c JOIN users u ON c.user_id = u.id ORDER BY c.points DESC LIMIT 10').fetchall()
+    # leaderboard: one page from the in-memory index, plus this user's rank
+    page = max(request.args.get('page', 1, type=int), 1)
+    top = leaderboard.top(db, LEADERBOARD_PAGE_SIZE, (page - 1) * LEADERBOARD_PAGE_SIZE)
+    has_next = leaderboard.size() > page * LEADERBOARD_PAGE_SIZE
     me = db.execute('SELECT * FROM community WHERE user_id = ?', (uid,)).fetchone()
+    my_rank = leaderboard.rank(db, uid)
+    
+    # Get active challenges: the first page here (one extra row tells whether /challenges has more)
+    active_challenges = db.execute('''
+        SELECT c.*, uc.status as user_status, uc.progress_value 
+        FROM challenges c 
+        LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
+        WHERE c.end_date >= date('now') 
+        ORDER BY c.start_date DESC, c.end_date DESC
+        LIMIT ?
+    ''', (uid, CHALLENGES_PAGE_SIZE + 1)).fetchall()
+    more_challenges = len(active_challenges) > CHALLENGES_PAGE_SIZE
+    active_challenges = active_challenges[:CHALLENGES_PAGE_SIZE]
+    
+    # Get user's challenges
+    my_challenges = db.execute('''
+        SELECT c.*, uc.progress_value, uc.status 
+        FROM user_challenges uc 
+        JOIN challenges c ON uc.challenge_id = c.id 
+        WHERE uc.user_id = ? AND uc.status = 'active'
+    ''', (uid,)).fetchall()
     
-    # Get active challenges (handle if table doesn't exist)
-    try:
-        active_challenges = db.execute('''
-            SELECT c.*, uc.status as user_status, uc.progress_value 
-            FROM challenges c 
-            LEFT JOIN user_challenges uc ON c.id = uc.challenge_id AND uc.user_id = ?
-            WHERE c.end_date >= date('now') 
-            ORDER BY c.start_date DESC
-        ''', (uid,)).fetchall()
-        
-        # Get user's challenges
-        my_challenges = db.execute('''
-            SELECT c.*, uc.progress_value, uc.status 
-            FROM user_challenges uc 
-            JOIN challenges c ON uc.challenge_id = c.id 
-            WHERE uc.user_id = ? AND uc.status = 'active'
-        ''', (uid,)).fetchall()
-    except sqlite3.OperationalError as e:
-        # If tables don't exist, create them and return empty lists
-        check_and_create_tables()
-        active_challenges = []
-        my_challenges = []
-    
-    return render_template('community.html', leaderboard=leaderboard, me=me, 
-                         active_challenges=active_challenges, my_challenges=my_challenges)
+    return render_template('community.html', leaderboard=top, me=me, my_rank=my_rank, page=page, has_next=has_next,
+                         active_challenges=active_challenges, more_challenges=more_challenges,
+                         my_challenges=my_challenges)
 
 @app.route('/schedule')
 def schedule():
@@ -438,19 +650,14 @@ def schedule():
         ORDER BY scheduled_date ASC, status
     ''', (uid,)).fetchall()
     
-    # Get skipped workouts analysis
-    workouts = db.execute('SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC', (uid,)).fetchall()
-    schedule_list = [dict(s) for s in schedule_items]
-    workout_list = [dict(w) for w in workouts]
-    skipped = dynamic_adjuster.detect_skipped_workouts(schedule_list, workout_list)
+    # Get skipped workouts analysis (computed in SQL; no need to load the workout history)
+    schedule_list = ScheduleRecord.from_rows(schedule_items)
+    skipped = dynamic_adjuster.detect_skipped_workouts_db(db, uid)
     
     # Get sleep quality
-    sleep_data = db.execute('SELECT sleep_hours FROM wearabled WHERE user_id = ? AND sleep_hours > 0 ORDER BY recorded_at DESC LIMIT 7', (uid,)).fetchall()
-    sleep_records = [{'sleep_hours': s['sleep_hours']} for s in sleep_data]
-    sleep_quality = dynamic_adjuster.analyze_sleep_quality(sleep_records) if sleep_data else {'quality': 'unknown', 'score': 0.8}
+    sleep_quality = rollups.sleep_quality(db, uid) or {'quality': 'unknown', 'score': 0.8}
     
-    user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-    user_dict = dict(user)
+    user_dict = current_profile(db)
     
     # Get adjustments
     adjustment = dynamic_adjuster.adjust_workout_schedule(
@@ -464,8 +671,7 @@ def schedule():
 def generate_schedule():
     if 'user_id' not in session: return redirect(url_for('login'))
     db = get_db(); uid = session['user_id']
-    user = db.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-    user_dict = dict(user)
+    user_dict = current_profile(db)
     
     # Generate weekly schedule
     weekly_schedule = dynamic_adjuster.generate_weekly_schedule(user_dict)
@@ -489,19 +695,16 @@ def complete_schedule(schedule_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     db = get_db(); uid = session['user_id']
     
-    # Mark schedule as completed
-    db.execute('UPDATE workout_schedule SET status = ? WHERE id = ? AND user_id = ?', 
-               ('completed', schedule_id, uid))
-    db.commit()
-    
-    # Award points
-    community = db.execute('SELECT * FROM community WHERE user_id = ?', (uid,)).fetchone()
-    if community:
-        new_points = (community['points'] or 0) + 10
-        db.execute('UPDATE community SET points = ? WHERE user_id = ?', (new_points, uid))
-    else:
-        db.execute('INSERT INTO community (user_id, points) VALUES (?, ?)', (uid, 10))
+    # Mark schedule as completed and award points in one transaction; a repeat completion pays nothing
+    completed = db.execute('UPDATE workout_schedule SET status = ? WHERE id = ? AND user_id = ? AND status != ?',
+                           ('completed', schedule_id, uid, 'completed')).rowcount
+    new_points = points.award(db, uid, 10, 'schedule', schedule_id) if completed else None
     db.commit()
+    if new_points is None:
+        flash('Workout already completed.', 'info')
+        return redirect(url_for('schedule'))
+    leaderboard.record(uid, new_points)
+    dashboard_cache.invalidate(uid)
     
     flash('Workout marked as completed! +10 points', 'success')
     return redirect(url_for('schedule'))
@@ -511,18 +714,26 @@ def challenges():
     if 'user_id' not in session: return redirect(url_for('login'))
     db = get_db(); uid = session['user_id']
     
-    # Get all active challenges
-    all_challenges = db.execute('''
-        SELECT c.*, 
-               COUNT(DISTINCT uc.user_id) as participants,
-               uc.status as user_status
-        FROM challenges c
-        LEFT JOIN user_challenges uc ON c.id = uc.challenge_id
-        LEFT JOIN user_challenges my_uc ON c.id = my_uc.challenge_id AND my_uc.user_id = ?
-        WHERE c.end_date >= date('now')
-        GROUP BY c.id
-        ORDER BY c.start_date DESC
-    ''', (uid,)).fetchall()
+    # One page of active challenges, newest first (walks idx_challenges_start_end and stops after the page)
+    page = max(request.args.get('page', 1, type=int), 1)
+    rows = db.execute('''
+        SELECT id, name, description, start_date, end_date, target_metric, target_value, points_reward,
+               participant_count AS participants
+        FROM challenges
+        WHERE end_date >= date('now')
+        ORDER BY start_date DESC, end_date DESC
+        LIMIT ? OFFSET ?
+    ''', (CHALLENGES_PAGE_SIZE + 1, (page - 1) * CHALLENGES_PAGE_SIZE)).fetchall()
+    has_next = len(rows) > CHALLENGES_PAGE_SIZE
+    all_challenges = [dict(r) for r in rows[:CHALLENGES_PAGE_SIZE]]
+    
+    # This user's status in just the challenges on the page
+    if all_challenges:
+        ids = tuple(c['id'] for c in all_challenges)
+        statuses = dict(db.execute(f'SELECT challenge_id, status FROM user_challenges WHERE user_id = ? '
+                                   f'AND challenge_id IN ({",".join("?" * len(ids))})', (uid,) + ids).fetchall())
+        for challenge in all_challenges:
+            challenge['user_status'] = statuses.get(challenge['id'])
     
     # Get user's active challenges
     my_challenges = db.execute('''
@@ -532,24 +743,32 @@ def challenges():
         WHERE uc.user_id = ? AND uc.status = 'active'
     ''', (uid,)).fetchall()
     
-    return render_template('challenges.html', challenges=all_challenges, my_challenges=my_challenges)
+    return render_template('challenges.html', challenges=all_challenges, my_challenges=my_challenges,
+                         page=page, has_next=has_next)
 
 @app.route('/challenges/join/<int:challenge_id>', methods=['POST'])
 def join_challenge(challenge_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     db = get_db(); uid = session['user_id']
     
-    # Check if already joined
-    existing = db.execute('SELECT * FROM user_challenges WHERE user_id = ? AND challenge_id = ?', 
-                         (uid, challenge_id)).fetchone()
-    if existing:
-        flash('You are already part of this challenge!', 'info')
-        return redirect(url_for('challenges'))
-    
-    # Join challenge
-    db.execute('INSERT INTO user_challenges (user_id, challenge_id, status) VALUES (?, ?, ?)', 
-               (uid, challenge_id, 'active'))
+    # Idempotent join: uq_user_challenges_user_challenge turns a repeat (or a concurrent double-click) into a no-op,
+    # and only an actual new row bumps the participant counter, in the same transaction
+    joined = db.execute('''
+        INSERT OR IGNORE INTO user_challenges (user_id, challenge_id, status)
+        SELECT ?, id, 'active' FROM challenges WHERE id = ?
+    ''', (uid, challenge_id)).rowcount
+    if joined:
+        db.execute('UPDATE challenges SET participant_count = participant_count + 1 WHERE id = ?', (challenge_id,))
     db.commit()
+    if not joined:
+        if db.execute('SELECT 1 FROM challenges WHERE id = ?', (challenge_id,)).fetchone():
+            flash('You are already part of this challenge!', 'info')
+        else:
+            flash('Challenge not found', 'danger')
+        return redirect(url_for('challenges'))
+    # Activity already logged inside the challenge window counts straight away
+    if update_challenges(db, uid):
+        flash('Challenge completed! Reward points added', 'success')
     
     flash('Successfully joined challenge!', 'success')
     return redirect(url_for('challenges'))
@@ -585,11 +804,12 @@ def seed_demo():
     return "Disabled"
 
 if __name__ == '__main__':
-    if not os.path.exists(DB_PATH):
+    if USE_MYSQL:
+        print('Using MySQL database', db_config['database'], 'on', db_config['host'])
+    migrate_database()  # no-op if AUTO_MIGRATE already ran at import
+    if _new_database:
+        # Tables were just created by the migrations; insert demo user and sample data
         conn = sqlite3.connect(DB_PATH)
-        with open(os.path.join(os.path.dirname(__file__), 'sql', 'sqlite_schema.sql'),'r') as f:
-            conn.executescript(f.read())
-        # insert demo user and sample data
         pwd = 'db9f57e3dab2c039c93c6c0c7687f1f6b32d24f00c4d527f406e67a5145e8e3c'
         conn.execute("INSERT INTO users (name,email,password_hash,age,gender,height_cm,weight_kg,activity_level) VALUES (?,?,?,?,?,?,?,?)",
                      ('Demo User','demo@demo.com',pwd,25,'Male',175,70,'Moderate'))
@@ -600,12 +820,11 @@ if __name__ == '__main__':
                      (uid,'2025-11-16','Breakfast',450,25,50,12,'Oats and eggs'))
         conn.execute("INSERT INTO wearabled (user_id,recorded_at,steps,heart_rate,sleep_hours,calories_burned) VALUES (?,?,?,?,?,?)",
                      (uid,'2025-11-16 08:00:00',7000,72,7.5,500))
+        rollups.refresh(conn, uid, ['2025-11-16'])
         conn.execute("INSERT INTO progress (user_id,date,weight_kg,bmi,notes) VALUES (?,?,?,?,?)",
                      (uid,'2025-11-01',70,22.9,'Start'))
-        conn.execute("INSERT INTO community (user_id,points,badges,rank) VALUES (?,?,?,?)",(uid,320,'Consistent Runner',2))
+        conn.execute("INSERT INTO community (user_id,points,badges,rank) VALUES (?,?,?,?)",(uid,320,'Consistent Runner',1))
+        conn.execute("INSERT INTO points_events (user_id,delta,reason) VALUES (?,?,?)",(uid,320,'opening_balance'))
         conn.commit(); conn.close()
         print('Initialized DB at', DB_PATH)
-    else:
-        # Database exists, check for missing tables (migration)
-        ensure_tables()
     app.run(debug=True)
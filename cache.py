@@ -0,0 +1,274 @@
+"""
+Snapshot Caches
+Per-user page snapshots (e.g. the dashboard) and user profiles kept in an
+in-process LRU with TTL, or in a small SQLite file shared by every worker
+process on the host. Write routes invalidate the affected user's entries explicitly.
+A build that an invalidation overtakes is not stored, but that check is
+per-process: with the shared SQLite store, a build in one worker can still store
+data another worker just invalidated, until its TTL runs out (profile entries are
+also rejected when the session already holds a newer version stamp).
+"""
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MemoryStore:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def size(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Cache entries in a local SQLite file so every worker process on the host
+    shares snapshots and sees invalidations made by the others
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.evictions = 0
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value BLOB)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # it is only a cache
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute('SELECT expires_at, value FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return pickle.loads(row[1])
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)',
+                     (key, time.time() + ttl, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+        conn.commit()
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def create_store(spec, max_entries=1024):
+    """
+    Build a store from a config string
+    Args:
+        spec: 'memory' or 'sqlite:/path/to/cache.db'
+    """
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec[len('sqlite:'):])
+    return MemoryStore(max_entries)
+
+
+class _BuildGuard:
+    """
+    Notices invalidations that land while a user's entry is being built, so the
+    stale build isn't stored. Only users with a build in flight are tracked, so it
+    holds at most one small entry per concurrent build. Sees this process only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._builds = {}  # user_id -> [builds in flight, invalidations since the first began]
+
+    def start(self, user_id):
+        with self._lock:
+            entry = self._builds.setdefault(user_id, [0, 0])
+            entry[0] += 1
+            return entry[1]
+
+    def finish(self, user_id, token):
+        """True if the user was not invalidated since start() returned token"""
+        with self._lock:
+            entry = self._builds[user_id]
+            entry[0] -= 1
+            if not entry[0]:
+                del self._builds[user_id]
+            return entry[1] == token
+
+    def invalidated(self, user_id):
+        with self._lock:
+            entry = self._builds.get(user_id)
+            if entry is not None:
+                entry[1] += 1
+
+
+class SnapshotCache:
+    """Per-user snapshot cache with hit/miss counters for sizing"""
+
+    def __init__(self, store, prefix, ttl=60):
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._guard = _BuildGuard()
+
+    def _key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def get_or_build(self, user_id, build):
+        """
+        Return the cached snapshot for a user, building and storing it on a miss
+        Args:
+            user_id: User id
+            build: Callable returning a picklable snapshot (plain dicts/lists, not DB rows)
+        """
+        try:
+            snapshot = self.store.get(self._key(user_id))
+        except Exception as e:
+            print(f"Cache read error: {e}")
+            snapshot = None
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        token = self._guard.start(user_id)
+        try:
+            snapshot = build()
+        finally:
+            fresh = self._guard.finish(user_id, token)
+        if not fresh:
+            return snapshot  # invalidated while we were building; don't cache old data
+        try:
+            self.store.set(self._key(user_id), snapshot, self.ttl)
+        except Exception as e:
+            print(f"Cache write error: {e}")
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Drop a user's snapshot; called by every route that changes what it shows"""
+        self.invalidations += 1
+        self._guard.invalidated(user_id)
+        try:
+            self.store.delete(self._key(user_id))
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'entries': self.store.size(), 'evictions': self.store.evictions}
+
+
+class ProfileCache:
+    """
+    Per-user profile cache validated by version stamps.
+    Each entry is a UserProfile carrying the users.profile_version it was read at.
+    Callers pass the version they expect (kept in the user's session, which every
+    worker sees), so after an edit through any worker, older entries elsewhere
+    count as stale and are reloaded instead of served.
+    hook(event, user_id) is called for every 'hit', 'miss', 'stale' and 'invalidate'.
+    """
+
+    def __init__(self, store, prefix='profile', ttl=300, hook=None):
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hook = hook
+        self.counts = {'hit': 0, 'miss': 0, 'stale': 0, 'invalidate': 0}
+        self._guard = _BuildGuard()
+
+    def _key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def _emit(self, event, user_id):
+        self.counts[event] += 1
+        if self.hook is not None:
+            try:
+                self.hook(event, user_id)
+            except Exception as e:
+                print(f"Profile cache hook error: {e}")
+
+    def get(self, user_id, version, load):
+        """
+        Return a user's profile, loading and storing it on a miss or a stale entry
+        Args:
+            user_id: User id
+            version: profile_version the caller expects, or None to accept any cached entry
+            load: Callable returning a fresh UserProfile (or None if the user is gone)
+        """
+        try:
+            profile = self.store.get(self._key(user_id))
+        except Exception as e:
+            print(f"Cache read error: {e}")
+            profile = None
+        if profile is not None and (version is None or profile.profile_version == version):
+            self._emit('hit', user_id)
+            return profile
+        self._emit('miss' if profile is None else 'stale', user_id)
+        token = self._guard.start(user_id)
+        try:
+            profile = load()
+        finally:
+            fresh = self._guard.finish(user_id, token)
+        if profile is not None and fresh:
+            self.put(user_id, profile)
+        return profile
+
+    def put(self, user_id, profile):
+        try:
+            self.store.set(self._key(user_id), profile, self.ttl)
+        except Exception as e:
+            print(f"Cache write error: {e}")
+
+    def invalidate(self, user_id):
+        """Drop a user's cached profile; called when the profile is edited"""
+        self._guard.invalidated(user_id)
+        self._emit('invalidate', user_id)
+        try:
+            self.store.delete(self._key(user_id))
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+
+    def stats(self):
+        lookups = self.counts['hit'] + self.counts['miss'] + self.counts['stale']
+        return dict(self.counts, hit_rate=round(self.counts['hit'] / lookups, 3) if lookups else None,
+                    entries=self.store.size())
@@ -0,0 +1,150 @@
+"""
+Challenge Engine
+Computes user_challenges.progress_value from workout, wearable and progress
+data over each challenge's window, marks challenges completed (paying out
+points_reward through the points ledger) and expires ones whose window closed.
+Each target_metric has one aggregator: a set-based query built once at import
+that evaluates every matching participation in a single statement, plus a
+function that turns its rows into progress values.
+"""
+from datetime import date, timedelta
+
+import points
+from records import parse_day
+
+
+def _participations(joins='', metric=None):
+    """FROM/WHERE for active participations whose window has opened; {users} is filled in per call"""
+    where = f"AND c.target_metric = '{metric}' " if metric else ''
+    return (f' FROM user_challenges uc JOIN challenges c ON c.id = uc.challenge_id {joins} '
+            f"WHERE uc.status = 'active' AND c.start_date <= ? {where}{{users}}")
+
+
+def _aggregate(metric, select, joins, group=True):
+    sql = f'SELECT uc.id, {select}' + _participations(joins, metric)
+    return sql + (' GROUP BY uc.id' if group else ' ORDER BY uc.id')
+
+
+def _totals(rows):
+    return {row[0]: float(row[1] or 0) for row in rows}
+
+
+def _weight_lost(rows):
+    # Baseline is the last weigh-in before the window, else the first one inside it
+    progress = {}
+    for uc_id, before, first, latest in rows:
+        baseline = before if before is not None else first
+        progress[uc_id] = round(max(baseline - latest, 0), 1) if baseline is not None and latest is not None else 0.0
+    return progress
+
+
+def _longest_streak(rows):
+    # rows are (uc.id, workout date) ordered by participation then date, one per day (date NULL: none yet)
+    progress = {}
+    previous = {}
+    current = {}
+    for uc_id, value in rows:
+        day = parse_day(value)
+        progress.setdefault(uc_id, 0.0)
+        if day is None:
+            continue
+        if previous.get(uc_id) == day - timedelta(days=1):
+            current[uc_id] += 1
+        else:
+            current[uc_id] = 1
+        previous[uc_id] = day
+        progress[uc_id] = float(max(progress[uc_id], current[uc_id]))
+    return progress
+
+
+_WORKOUTS_IN_WINDOW = ('LEFT JOIN workout w ON w.user_id = uc.user_id '
+                       'AND w.date >= c.start_date AND w.date <= c.end_date')
+_WEIGHT = ('(SELECT p.weight_kg FROM progress p WHERE p.user_id = uc.user_id AND p.date {cond} '
+           'ORDER BY p.date {order} LIMIT 1)')
+
+# target_metric -> (query, rows -> {user_challenges.id: progress})
+AGGREGATORS = {
+    'steps': (_aggregate('steps', 'COALESCE(SUM(d.steps), 0)',
+                         'LEFT JOIN wearable_daily d ON d.user_id = uc.user_id '
+                         'AND d.day >= c.start_date AND d.day <= c.end_date'), _totals),
+    'workouts': (_aggregate('workouts', 'COUNT(w.id)', _WORKOUTS_IN_WINDOW), _totals),
+    'calories': (_aggregate('calories', 'COALESCE(SUM(w.calories_burned), 0)', _WORKOUTS_IN_WINDOW), _totals),
+    'weight_loss': (_aggregate('weight_loss', ', '.join((
+        _WEIGHT.format(cond='< c.start_date', order='DESC'),
+        _WEIGHT.format(cond='>= c.start_date AND p.date <= c.end_date', order='ASC'),
+        _WEIGHT.format(cond='>= c.start_date AND p.date <= c.end_date', order='DESC'))), '', group=False),
+        _weight_lost),
+    'streak': ('SELECT DISTINCT uc.id, w.date' + _participations(_WORKOUTS_IN_WINDOW, 'streak')
+               + ' ORDER BY uc.id, w.date', _longest_streak),
+}
+
+PARTICIPANTS = ('SELECT uc.id, uc.user_id, uc.progress_value, c.target_value, c.end_date, c.points_reward'
+                + _participations())
+
+
+def _user_filter(user_ids):
+    if user_ids is None:
+        return '', ()
+    user_ids = tuple(user_ids)
+    return f'AND uc.user_id IN ({",".join("?" * len(user_ids))})', user_ids
+
+
+def compute_progress(db, user_ids=None, today=None):
+    """
+    Current progress of every active participation (all users, or only user_ids)
+    Returns:
+        {user_challenges.id: progress_value}
+    """
+    today = today or date.today().isoformat()
+    users, params = _user_filter(user_ids)
+    if user_ids is not None and not params:
+        return {}
+    progress = {}
+    for query, reduce in AGGREGATORS.values():
+        progress.update(reduce(db.execute(query.format(users=users), (today,) + params).fetchall()))
+    return progress
+
+
+def evaluate(db, user_ids=None, today=None):
+    """
+    Update progress, complete and pay out reached challenges, expire closed ones
+    Runs inside the caller's transaction; after committing, pass each payout to
+    Leaderboard.record(user_id, total).
+    Args:
+        db: Open connection
+        user_ids: Only evaluate these users' challenges (None = everyone)
+        today: 'YYYY-MM-DD' evaluation date (default today)
+    Returns:
+        dict with evaluated, updated, completed, expired and payouts [(user_id, new_total)]
+    """
+    today = today or date.today().isoformat()
+    progress = compute_progress(db, user_ids, today)
+    result = {'evaluated': len(progress), 'updated': 0, 'completed': 0, 'expired': 0, 'payouts': []}
+    if not progress:
+        return result
+    users, params = _user_filter(user_ids)
+    rows = db.execute(PARTICIPANTS.format(users=users), (today,) + params).fetchall()
+    updates = []
+    for uc_id, user_id, current, target, end_date, reward in rows:
+        value = progress.get(uc_id)
+        if value is None:
+            continue  # unknown target_metric
+        if target is not None and value >= target:
+            status = 'completed'
+        elif str(end_date)[:10] < today:
+            status = 'expired'
+        else:
+            status = 'active'
+        if value != current or status != 'active':
+            updates.append((value, status, uc_id))
+        if status == 'active':
+            continue
+        result[status] += 1
+        # The ledger key (challenge, user_challenges.id) makes the payout happen once
+        total = points.award(db, user_id, reward, 'challenge', uc_id) if status == 'completed' and reward else None
+        if total is not None:
+            result['payouts'].append((user_id, total))
+    if updates:
+        db.executemany('UPDATE user_challenges SET progress_value = ?, status = ? WHERE id = ?', updates)
+    result['updated'] = len(updates)
+    return result
@@ -0,0 +1,486 @@
+"""
+Database Connection Management
+Pools connections across requests. SQLite is the default; USE_MYSQL=true routes
+every query through a bounded pymysql pool that speaks the same qmark (?) API.
+"""
+import os
+import re
+import time
+import queue
+import sqlite3
+import threading
+import functools
+from contextlib import contextmanager
+
+
+def connect_sqlite(path, cache_kb=16000, mmap_bytes=256 * 1024 * 1024, busy_timeout_ms=5000):
+    """
+    Open a SQLite connection with the pragmas every connection in the app should use
+    Args:
+        path: Database file
+        cache_kb: Page cache size per connection in KiB
+        mmap_bytes: Size of the memory-mapped I/O window
+        busy_timeout_ms: How long a writer waits for a lock before "database is locked"
+    Returns:
+        sqlite3.Connection with sqlite3.Row rows
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')  # readers no longer block the writer
+    conn.execute('PRAGMA synchronous=NORMAL')  # safe with WAL, avoids an fsync per commit
+    conn.execute(f'PRAGMA cache_size=-{int(cache_kb)}')
+    conn.execute(f'PRAGMA mmap_size={int(mmap_bytes)}')
+    conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+class SQLitePool:
+    """
+    Reuses SQLite connections instead of opening one per request.
+    A connection is only ever used by one thread at a time: it is checked out
+    for the duration of a request and returned to the idle list afterwards.
+    """
+    dialect = 'sqlite'
+
+    def __init__(self, path, max_idle=16, **pragmas):
+        self.path = path
+        self.max_idle = max_idle
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()  # most recently used first, its pages are warm
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'closed': 0, 'rollbacks': 0, 'in_use': 0}
+
+    def acquire(self):
+        """Check out a connection for the current thread"""
+        try:
+            conn = self._idle.get_nowait()
+            key = 'reused'
+        except queue.Empty:
+            conn = connect_sqlite(self.path, **self.pragmas)
+            key = 'created'
+        with self._lock:
+            self._stats[key] += 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        with self._lock:
+            self._stats['in_use'] -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats['rollbacks'] += 1
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        if self._idle.qsize() >= self.max_idle:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager for code that runs outside a Flask request"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Pool counters, e.g. {'created': 4, 'reused': 1200, 'idle': 4, ...}"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        stats['max_idle'] = self.max_idle
+        return stats
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones are closed when released)"""
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._stats['closed'] += 1
+
+
+# --- MySQL ---------------------------------------------------------------
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free in time"""
+
+
+# SQLite-isms used in app queries and their MySQL spelling
+_DIALECT_REWRITES = (
+    (re.compile(r"""date\(\s*['"]now['"]\s*\)""", re.IGNORECASE), 'CURDATE()'),
+    (re.compile(r'\bINSERT\s+OR\s+IGNORE\b', re.IGNORECASE), 'INSERT IGNORE'),
+)
+
+
+@functools.lru_cache(maxsize=512)
+def translate_query(sql):
+    """
+    Convert a qmark-style SQLite query to pymysql's format style
+    '?' placeholders become '%s' and literal '%' is escaped, but only outside
+    quoted strings and identifiers so values like 'a?b' are left alone.
+    """
+    for pattern, replacement in _DIALECT_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    out = []
+    quote = None
+    for ch in sql:
+        if quote:
+            if ch == quote:
+                quote = None
+            out.append('%%' if ch == '%' else ch)
+        elif ch in ('\'', '"', '`'):
+            quote = ch
+            out.append(ch)
+        elif ch == '?':
+            out.append('%s')
+        elif ch == '%':
+            out.append('%%')
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+class Row:
+    """Row with both index and column-name access, like sqlite3.Row"""
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values, index):
+        self._values = values
+        self._index = index
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return self._values[self._index[key]]
+
+    def keys(self):
+        return list(self._index)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f'Row({dict(zip(self._index, self._values))!r})'
+
+
+class MySQLCursor:
+    """Wraps a pymysql cursor so fetches return Row objects"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._index = None
+
+    def _columns(self):
+        if self._index is None and self._cursor.description:
+            self._index = {d[0]: i for i, d in enumerate(self._cursor.description)}
+        return self._index
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate_query(sql), tuple(params))
+        self._index = None
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_query(sql), [tuple(p) for p in seq_of_params])
+        self._index = None
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return Row(row, self._columns()) if row is not None else None
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        index = self._columns()
+        return [Row(r, index) for r in rows]
+
+    def fetchall(self):
+        index = self._columns()
+        return [Row(r, index) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(500)
+            if not rows:
+                return
+            yield from rows
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class MySQLConnection:
+    """
+    Minimal sqlite3.Connection look-alike over a pymysql connection,
+    so route code can call db.execute(sql_with_qmarks, params) on either backend
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.in_transaction = False
+        self.last_used = time.monotonic()
+
+    def cursor(self):
+        return MySQLCursor(self.raw.cursor())
+
+    def execute(self, sql, params=()):
+        self.in_transaction = True  # InnoDB holds a read view until commit/rollback
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        self.in_transaction = True
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def stream(self, sql, params=()):
+        """Execute on an unbuffered server-side cursor so rows arrive as they are fetched"""
+        from pymysql.cursors import SSCursor
+        self.in_transaction = True
+        return MySQLCursor(self.raw.cursor(SSCursor)).execute(sql, params)
+
+    def executescript(self, script):
+        for statement in script.split(';'):
+            if statement.strip():
+                self.execute(statement)
+        self.commit()
+
+    def commit(self):
+        self.raw.commit()
+        self.in_transaction = False
+
+    def rollback(self):
+        self.raw.rollback()
+        self.in_transaction = False
+
+    def close(self):
+        self.raw.close()
+
+
+def mysql_connect_factory(config):
+    """Return a zero-argument callable that opens a raw pymysql connection"""
+    import pymysql
+    from pymysql.constants import FIELD_TYPE
+    from pymysql.converters import conversions
+
+    # Keep dates as 'YYYY-MM-DD' strings like SQLite so route code can strptime them
+    conv = dict(conversions)
+    for field_type in (FIELD_TYPE.DATE, FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP):
+        conv[field_type] = str
+
+    def connect():
+        return pymysql.connect(
+            host=config['host'], port=config['port'], user=config['user'],
+            password=config['password'], database=config['database'],
+            charset='utf8mb4', autocommit=False, conv=conv,
+            connect_timeout=config.get('connect_timeout', 5)
+        )
+    return connect
+
+
+class MySQLPool:
+    """
+    Bounded pool of pymysql connections with the same interface as SQLitePool.
+    At most max_size connections exist at once; callers wait up to
+    acquire_timeout for one to free up. Idle connections are pinged before reuse
+    once they have been idle for ping_after seconds, and closed after idle_timeout.
+    """
+    dialect = 'mysql'
+
+    def __init__(self, connect, max_size=10, acquire_timeout=10.0, ping_after=30.0, idle_timeout=300.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.ping_after = ping_after
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []  # stack of MySQLConnection, most recently used last
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'closed': 0, 'rollbacks': 0, 'in_use': 0,
+                       'pings_failed': 0, 'evicted_idle': 0, 'timeouts': 0}
+
+    def acquire(self):
+        """Check out a connection, waiting if the pool is at max_size"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(f'no MySQL connection free after {self.acquire_timeout}s')
+        try:
+            conn = self._checkout_idle()
+            if conn is None:
+                conn = MySQLConnection(self._connect())
+                key = 'created'
+            else:
+                key = 'reused'
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats[key] += 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection, ending any open transaction so the next user sees fresh data"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats['rollbacks'] += 1
+            conn.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        except Exception:
+            self._close(conn)
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager for code that runs outside a Flask request"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def _checkout_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            # Evict connections the server has probably timed out on
+            stale = [c for c in self._idle if now - c.last_used > self.idle_timeout]
+            if stale:
+                self._idle = [c for c in self._idle if now - c.last_used <= self.idle_timeout]
+                self._stats['evicted_idle'] += len(stale)
+            conn = self._idle.pop() if self._idle else None
+        for c in stale:
+            self._close(c)
+        if conn is not None and now - conn.last_used > self.ping_after:
+            try:
+                conn.raw.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._stats['pings_failed'] += 1
+                self._close(conn)
+                return None
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closed'] += 1
+
+
+def iter_batches(conn, sql, params=(), size=1000):
+    """
+    Yield lists of up to size rows without materializing the whole result
+    SQLite cursors already step through results lazily; MySQL needs a
+    server-side cursor, otherwise pymysql reads every row before returning.
+    """
+    stream = getattr(conn, 'stream', None)
+    cursor = stream(sql, params) if stream else conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+# --- Configuration -----------------------------------------------------------
+
+def config_from_env(sqlite_path):
+    """
+    Read the storage backend from the environment
+    Returns:
+        Plain (picklable) dict, so worker processes can open their own connections
+    """
+    if os.environ.get('USE_MYSQL', 'false').lower() == 'true':
+        return {
+            'dialect': 'mysql',
+            'host': os.environ.get('MYSQL_HOST', 'localhost'),
+            'port': int(os.environ.get('MYSQL_PORT', '3306')),
+            'user': os.environ.get('MYSQL_USER', 'root'),
+            'password': os.environ.get('MYSQL_PASSWORD', ''),
+            'database': os.environ.get('MYSQL_DB', 'fitness_planner'),
+            'pool_size': int(os.environ.get('MYSQL_POOL_SIZE', '10')),
+            'idle_timeout': float(os.environ.get('MYSQL_IDLE_TIMEOUT', '300')),
+        }
+    return {
+        'dialect': 'sqlite',
+        'path': sqlite_path,
+        'max_idle': int(os.environ.get('DB_POOL_IDLE', '16')),
+        'cache_kb': int(os.environ.get('SQLITE_CACHE_KB', '16000')),
+        'mmap_bytes': int(os.environ.get('SQLITE_MMAP_MB', '256')) * 1024 * 1024,
+        'busy_timeout_ms': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    }
+
+
+def create_pool(config, connect=None):
+    """
+    Build the connection pool for a config from config_from_env
+    Args:
+        config: Backend config dict
+        connect: Optional raw-connection factory for MySQL (e.g. an in-process stand-in for tests)
+    """
+    if config['dialect'] == 'mysql':
+        return MySQLPool(connect or mysql_connect_factory(config), max_size=config['pool_size'],
+                         idle_timeout=config['idle_timeout'])
+    return SQLitePool(config['path'], max_idle=config['max_idle'], cache_kb=config['cache_kb'],
+                      mmap_bytes=config['mmap_bytes'], busy_timeout_ms=config['busy_timeout_ms'])
+
+
+def connect(config):
+    """Open a single unpooled connection (background workers and CLI jobs)"""
+    if config['dialect'] == 'mysql':
+        return MySQLConnection(mysql_connect_factory(config)())
+    return connect_sqlite(config['path'], cache_kb=config['cache_kb'], mmap_bytes=config['mmap_bytes'],
+                          busy_timeout_ms=config['busy_timeout_ms'])
@@ -6,6 +6,8 @@ sleep patterns, and adherence
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from records import schedule_day
+
 
 class DynamicAdjuster:
     """Handles automatic adjustment of workout schedules and diet plans"""
@@ -18,7 +20,8 @@ class DynamicAdjuster:
         """
         Analyze sleep quality from wearable data
         Args:
-            sleep_data: List of sleep records with sleep_hours
+            sleep_data: List of sleep records with sleep_hours, oldest first
+                        (daily totals from rollups.recent_sleep)
         Returns:
             dict with sleep_quality score and recommendations
         """
@@ -33,7 +36,15 @@ class DynamicAdjuster:
         
         avg_sleep = sum(recent_sleep) / len(recent_sleep)
         latest_sleep = recent_sleep[-1] if recent_sleep else 0
-        
+        return self.score_sleep(avg_sleep, latest_sleep)
+    
+    def score_sleep(self, avg_sleep, latest_sleep):
+        """
+        Sleep quality from the window average and the latest night
+        (shared by analyze_sleep_quality and the persisted rollups.sleep_state)
+        Returns:
+            dict with quality, score, avg_sleep, latest_sleep and recommendation
+        """
         # Calculate sleep quality score (0-1)
         if self.min_sleep_hours <= avg_sleep <= self.max_sleep_hours:
             quality_score = 1.0
@@ -56,28 +67,28 @@ class DynamicAdjuster:
             quality_score *= 0.8
             quality = 'poor'
         
-        # Generate recommendations
-        if quality_score < 0.6:
-            recommendation = 'Consider reducing workout intensity today. Prioritize rest and recovery.'
-        elif quality_score < 0.8:
-            recommendation = 'Moderate intensity workout recommended. Ensure adequate hydration.'
-        else:
-            recommendation = 'Good sleep quality. You can proceed with planned workout intensity.'
-        
         return {
             'quality': quality,
             'score': quality_score,
             'avg_sleep': round(avg_sleep, 1),
             'latest_sleep': round(latest_sleep, 1),
-            'recommendation': recommendation
+            'recommendation': self.sleep_recommendation(quality_score)
         }
     
+    def sleep_recommendation(self, quality_score):
+        """Advice text for a sleep quality score"""
+        if quality_score < 0.6:
+            return 'Consider reducing workout intensity today. Prioritize rest and recovery.'
+        elif quality_score < 0.8:
+            return 'Moderate intensity workout recommended. Ensure adequate hydration.'
+        return 'Good sleep quality. You can proceed with planned workout intensity.'
+    
     def detect_skipped_workouts(self, schedule_data, workout_data):
         """
         Detect workouts that were scheduled but not completed
         Args:
-            schedule_data: List of scheduled workouts
-            workout_data: List of completed workouts
+            schedule_data: List of scheduled workouts (dicts or records.ScheduleRecord)
+            workout_data: List of completed workouts (dicts or records.WorkoutRecord)
         Returns:
             dict with skipped workouts and adherence rate
         """
@@ -96,7 +107,7 @@ class DynamicAdjuster:
         today = datetime.now().date()
         
         for schedule in schedule_data:
-            scheduled_date = datetime.strptime(schedule.get('scheduled_date'), '%Y-%m-%d').date()
+            scheduled_date = schedule_day(schedule)
             status = schedule.get('status', 'pending')
             
             # Check if workout was skipped (past date, not completed, status still pending)
@@ -119,6 +130,47 @@ class DynamicAdjuster:
             'completed_count': completed_count
         }
     
+    def detect_skipped_workouts_db(self, db, user_id, today=None):
+        """
+        detect_skipped_workouts() computed in the database: one aggregate over the
+        user's schedule and one anti-join against workout, both index-only, instead
+        of loading the whole schedule and workout history
+        Args:
+            db: Open connection
+            user_id: User id
+            today: 'YYYY-MM-DD' (defaults to today)
+        Returns:
+            Same dict shape as detect_skipped_workouts
+        """
+        today = today or datetime.now().date().isoformat()
+        total_scheduled, completed_count = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0) "
+            "FROM workout_schedule WHERE user_id = ?", (user_id,)).fetchone()
+        if not total_scheduled:
+            return {'skipped': [], 'adherence_rate': 1.0, 'total_scheduled': 0}
+        
+        # Past pending workouts with no workout logged on that date
+        rows = db.execute('''
+            SELECT s.id, s.scheduled_date, s.workout_type FROM workout_schedule s
+            WHERE s.user_id = ? AND s.status = 'pending' AND s.scheduled_date < ?
+              AND NOT EXISTS (SELECT 1 FROM workout w WHERE w.user_id = s.user_id AND w.date = s.scheduled_date)
+            ORDER BY s.scheduled_date
+        ''', (user_id, today)).fetchall()
+        today_date = datetime.strptime(today, '%Y-%m-%d').date()
+        skipped = [{
+            'id': row[0],
+            'date': str(row[1]),
+            'workout_type': row[2],
+            'days_ago': (today_date - datetime.strptime(str(row[1]), '%Y-%m-%d').date()).days
+        } for row in rows]
+        
+        return {
+            'skipped': skipped,
+            'adherence_rate': round(completed_count / total_scheduled, 2),
+            'total_scheduled': total_scheduled,
+            'completed_count': int(completed_count)
+        }
+    
     def adjust_workout_schedule(self, user_data, skipped_workouts, sleep_quality, 
                                 current_schedule, recent_activity):
         """
@@ -127,7 +179,7 @@ class DynamicAdjuster:
             user_data: User profile
             skipped_workouts: Result from detect_skipped_workouts
             sleep_quality: Result from analyze_sleep_quality
-            current_schedule: List of upcoming scheduled workouts
+            current_schedule: List of upcoming scheduled workouts (dicts or records.ScheduleRecord)
             recent_activity: Recent workout history
         Returns:
             dict with adjustments and recommendations
@@ -169,9 +221,9 @@ class DynamicAdjuster:
         
         # Adjust upcoming schedule
         modified_schedule = []
+        today = datetime.now().date()
         for schedule in current_schedule:
-            scheduled_date = datetime.strptime(schedule.get('scheduled_date'), '%Y-%m-%d').date()
-            today = datetime.now().date()
+            scheduled_date = schedule_day(schedule)
             
             # Only adjust future workouts
             if scheduled_date >= today:
@@ -207,7 +259,7 @@ class DynamicAdjuster:
         Adjust diet plan based on activity and sleep
         Args:
             user_data: User profile
-            activity_level: Recent activity level (from wearable data)
+            activity_level: This week's activity (rollups.weekly_activity, avg_steps per day), or None
             sleep_quality: Sleep quality analysis
             current_diet: Current diet recommendations
         Returns:
@@ -235,7 +287,7 @@ class DynamicAdjuster:
             else:
                 protein_multiplier = 1.8
             
-            weight = user_data.get('weight_kg', 70)
+            weight = user_data.get('weight_kg') or 70  # NULL until the profile is filled in
             adjusted['protein_g_per_day'] = round(protein_multiplier * weight, 1)
         
         return adjusted
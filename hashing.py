@@ -0,0 +1,136 @@
+"""
+Password Hashing Pool
+Runs Werkzeug's PBKDF2 hashing and verification in a small process pool so a
+burst of logins or signups can't tie up request threads with CPU-bound work.
+The number of hashes running or waiting is bounded; once it is reached new
+requests fail fast with HashingBusy instead of queueing behind the burst.
+"""
+import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+except ImportError:  # not exported by every Werkzeug release
+    DEFAULT_PBKDF2_ITERATIONS = 260000
+
+LATENCY_SAMPLES = 1000
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated (or a hash timed out); ask the client to retry"""
+
+
+def hash_params(pwhash):
+    """
+    The parameters part of a Werkzeug hash, with default iterations filled in
+    'pbkdf2:sha256:260000$salt$hash' -> 'pbkdf2:sha256:260000'
+    """
+    method = pwhash.split('$', 1)[0]
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+
+class PasswordHasher:
+    """
+    Bounded, off-thread hash/verify with latency counters.
+    max_workers=0 hashes inline on the calling thread (still bounded and timed).
+    """
+
+    def __init__(self, method='pbkdf2:sha256', max_workers=2, max_pending=32, timeout=10.0):
+        self.method = method
+        self.params = hash_params(method)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # Slots cover hashes running in the pool plus those queued for it
+        self._slots = threading.BoundedSemaphore(max(max_workers, 1) + max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._latency = deque(maxlen=LATENCY_SAMPLES)  # seconds, most recent hashes
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0, 'timeouts': 0, 'in_flight': 0}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashingBusy('password hashing is saturated')
+        with self._lock:
+            self._stats['in_flight'] += 1
+        started = time.perf_counter()
+        if self.max_workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._finish(kind, started)
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._finish(kind, started)
+            raise
+        # The slot is held until the worker is done, even if the caller gave up waiting,
+        # so timed-out hashes still count against max_workers + max_pending
+        future.add_done_callback(lambda _: self._finish(kind, started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HashingBusy('password hashing timed out')
+
+    def _finish(self, kind, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            self._stats[kind] += 1
+            self._latency.append(elapsed)
+        self._slots.release()
+
+    def hash(self, password):
+        """
+        Returns:
+            A new hash with the configured method
+        Raises:
+            HashingBusy when the pool is saturated
+        """
+        return self._run('hashed', generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """
+        Raises:
+            HashingBusy when the pool is saturated
+        """
+        if not pwhash:
+            return False
+        return self._run('verified', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if a stored hash was made with other parameters (e.g. fewer iterations) than configured"""
+        return bool(pwhash) and '$' in pwhash and hash_params(pwhash) != self.params
+
+    def rehashed(self):
+        with self._lock:
+            self._stats['rehashed'] += 1
+
+    def stats(self):
+        """Counters plus p50/p95/max latency (ms) over the most recent hashes"""
+        with self._lock:
+            stats = dict(self._stats)
+            samples = sorted(self._latency)
+        if samples:
+            stats['latency_ms'] = {
+                'p50': round(samples[len(samples) // 2] * 1000, 1),
+                'p95': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 1),
+                'max': round(samples[-1] * 1000, 1),
+            }
+        return stats
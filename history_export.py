@@ -0,0 +1,83 @@
+"""
+History Export
+Streams a user's workout, diet, wearable, progress and schedule rows as NDJSON
+or CSV. Rows are read in fetchmany batches and yielded as text chunks, so the
+first bytes go out immediately and memory stays flat however long the history is.
+"""
+import io
+import csv
+import json
+
+from db import iter_batches
+
+FETCH_SIZE = 1000
+EXPORT_FORMATS = ('ndjson', 'csv')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# table -> (exported columns, sort column); each sort follows a (user_id, column) index
+EXPORT_TABLES = {
+    'workout': (('id', 'date', 'workout_type', 'duration_min', 'calories_burned', 'notes'), 'date'),
+    'diet': (('id', 'date', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fats_g', 'notes'), 'date'),
+    'wearabled': (('id', 'recorded_at', 'steps', 'heart_rate', 'sleep_hours', 'calories_burned'), 'recorded_at'),
+    'progress': (('id', 'date', 'weight_kg', 'bmi', 'notes'), 'date'),
+    'workout_schedule': (('id', 'scheduled_date', 'workout_type', 'duration_min', 'status', 'created_at'),
+                         'scheduled_date'),
+}
+
+
+def resolve_tables(fmt, tables):
+    """
+    Check an export request
+    Args:
+        fmt: 'ndjson' or 'csv'
+        tables: Requested table names (empty means all of them)
+    Returns:
+        List of tables to export
+    Raises:
+        ValueError for unknown formats/tables, or CSV with more than one table
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of {", ".join(EXPORT_FORMATS)}')
+    tables = list(tables) or list(EXPORT_TABLES)
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise ValueError(f'unknown table: {", ".join(unknown)}')
+    if fmt == 'csv' and len(tables) != 1:
+        raise ValueError('CSV exports one table at a time; pick one with table=')
+    return tables
+
+
+def _batches(conn, user_id, table, fetch_size):
+    columns, order = EXPORT_TABLES[table]
+    sql = f'SELECT {", ".join(columns)} FROM {table} WHERE user_id = ? ORDER BY {order}, id'
+    return columns, iter_batches(conn, sql, (user_id,), fetch_size)
+
+
+def ndjson_chunks(conn, user_id, tables, fetch_size=FETCH_SIZE):
+    """One JSON object per row, tagged with its table, one text chunk per fetched batch"""
+    for table in tables:
+        columns, batches = _batches(conn, user_id, table, fetch_size)
+        for rows in batches:
+            yield ''.join(json.dumps({'table': table, **dict(zip(columns, row))}, default=str) + '\n'
+                          for row in rows)
+
+
+def csv_chunks(conn, user_id, table, fetch_size=FETCH_SIZE):
+    """Header row, then one text chunk per fetched batch (importable by history_import for workout/diet)"""
+    columns, batches = _batches(conn, user_id, table, fetch_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+
+
+def export_chunks(conn, user_id, fmt, tables, fetch_size=FETCH_SIZE):
+    """Text chunks for an export already checked by resolve_tables"""
+    if fmt == 'csv':
+        return csv_chunks(conn, user_id, tables[0], fetch_size)
+    return ndjson_chunks(conn, user_id, tables, fetch_size)
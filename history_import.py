@@ -0,0 +1,162 @@
+"""
+Workout and Diet History Import
+Streams CSV or NDJSON exports from other apps into the workout and diet tables.
+Rows are parsed, validated and inserted chunk by chunk, so memory stays bounded
+no matter how large the file is.
+"""
+import io
+import csv
+import time
+from datetime import datetime
+from itertools import islice
+
+from wearable_ingest import iter_ndjson
+
+CHUNK_SIZE = 5000
+MAX_ERRORS_REPORTED = 20
+FORMATS = ('csv', 'ndjson')
+
+
+def _text(value, name, required=False, max_len=500):
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f'{name} is required')
+    return value[:max_len]
+
+
+def _number(value, cast, name, high):
+    if value is None or value == '':
+        return cast(0)
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if not (0 <= number <= high):
+        raise ValueError(f'{name} must be between 0 and {high}')
+    return number
+
+
+def _date(value):
+    try:
+        # Exports often carry a time as well; only the day is stored
+        return datetime.strptime(str(value).strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError('date must look like YYYY-MM-DD')
+
+
+def _field(record, *names):
+    """First present column among a field's accepted names (form names and table names both work)"""
+    for name in names:
+        if name in record:
+            return record[name]
+    return None
+
+
+def parse_workout(record):
+    return (
+        _date(_field(record, 'date')),
+        _text(_field(record, 'workout_type', 'type'), 'workout_type', required=True, max_len=100),
+        _number(_field(record, 'duration_min', 'duration'), int, 'duration_min', 1440),
+        _number(_field(record, 'calories_burned', 'calories'), int, 'calories_burned', 20000),
+        _text(_field(record, 'notes'), 'notes'),
+    )
+
+
+def parse_diet(record):
+    return (
+        _date(_field(record, 'date')),
+        _text(_field(record, 'meal_type', 'meal'), 'meal_type', required=True, max_len=100),
+        _number(_field(record, 'calories'), int, 'calories', 20000),
+        _number(_field(record, 'protein_g', 'protein'), float, 'protein_g', 2000),
+        _number(_field(record, 'carbs_g', 'carbs'), float, 'carbs_g', 2000),
+        _number(_field(record, 'fats_g', 'fats'), float, 'fats_g', 2000),
+        _text(_field(record, 'notes'), 'notes'),
+    )
+
+
+# kind -> (row parser, INSERT statement)
+KINDS = {
+    'workout': (parse_workout,
+                'INSERT INTO workout (user_id,date,workout_type,duration_min,calories_burned,notes) '
+                'VALUES (?,?,?,?,?,?)'),
+    'diet': (parse_diet,
+             'INSERT INTO diet (user_id,date,meal_type,calories,protein_g,carbs_g,fats_g,notes) '
+             'VALUES (?,?,?,?,?,?,?,?)'),
+}
+
+
+def detect_format(filename):
+    """'ndjson' for .ndjson/.jsonl/.json files, otherwise 'csv'"""
+    name = (filename or '').lower()
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def iter_records(stream, fmt):
+    """
+    Lazily yield one dict per row of an uploaded or opened file
+    Args:
+        stream: Binary file object (upload stream or open(path, 'rb'))
+        fmt: 'csv' or 'ndjson'
+    """
+    if fmt == 'ndjson':
+        return iter_ndjson(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return ({(k or '').strip().lower(): v for k, v in row.items()} for row in csv.DictReader(text))
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_history(db, user_id, kind, records, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Validate and bulk-insert history rows for one user
+    Each chunk is inserted with executemany and committed on its own, so only one
+    chunk is ever held in memory.
+    Args:
+        db: Open connection
+        user_id: Owner of the imported rows
+        kind: 'workout' or 'diet'
+        records: Iterable of dicts (see iter_records)
+        chunk_size: Rows per insert/commit
+        progress: Optional callable receiving each chunk's stats dict
+    Returns:
+        Summary dict with rows, inserted, invalid, errors, chunks, seconds and rows_per_sec
+    """
+    parse, insert_sql = KINDS[kind]
+    summary = {'kind': kind, 'rows': 0, 'inserted': 0, 'invalid': 0, 'errors': [], 'chunks': 0}
+    started = chunk_started = time.perf_counter()
+    for number, chunk in enumerate(chunks(records, chunk_size), 1):
+        rows = []
+        for offset, record in enumerate(chunk):
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                if not isinstance(record, dict):
+                    raise ValueError('row must be an object')
+                rows.append((user_id,) + parse(record))
+            except ValueError as e:
+                summary['invalid'] += 1
+                if len(summary['errors']) < MAX_ERRORS_REPORTED:
+                    summary['errors'].append({'row': summary['rows'] + offset + 1, 'error': str(e)})
+        if rows:
+            db.executemany(insert_sql, rows)
+            db.commit()
+        summary['rows'] += len(chunk)
+        summary['inserted'] += len(rows)
+        summary['chunks'] = number
+        if progress:
+            # Includes reading and parsing the chunk from the file, not just the insert
+            now = time.perf_counter()
+            seconds, chunk_started = now - chunk_started, now
+            progress({'chunk': number, 'rows': len(chunk), 'inserted': len(rows),
+                      'seconds': round(seconds, 3), 'rows_per_sec': int(len(chunk) / seconds) if seconds else None})
+    seconds = time.perf_counter() - started
+    summary['seconds'] = round(seconds, 3)
+    summary['rows_per_sec'] = int(summary['rows'] / seconds) if seconds else None
+    return summary
@@ -0,0 +1,136 @@
+"""
+Leaderboard
+Keeps community points in an in-process sorted index (bisect over
+(-points, user_id)) so top-N pages and "my rank" are O(log n) lookups instead
+of sorting the community table on every /community view. The persisted
+community.rank column is maintained incrementally whenever points change
+(points.award calls update_ranks).
+Ranks are competition ranks: 1 + the number of users with more points.
+"""
+import time
+import bisect
+import threading
+
+
+def update_ranks(db, user_id, old, new):
+    """
+    Shift the persisted ranks after a user's points went from old to new
+    Only rows with points between the two totals are read or written: those
+    users move by one place and the user's stored rank moves past them, so an
+    award costs O(users passed). old=None means the user just got a community
+    row; everyone below new moves and the user's rank is counted from the users
+    above, as it is when the stored rank is missing.
+    Runs inside the caller's transaction; call Leaderboard.record() after commit.
+    """
+    current = None
+    if old is not None:
+        row = db.execute('SELECT `rank` FROM community WHERE user_id = ?', (user_id,)).fetchone()
+        current = row[0] if row else None
+    if old is None:
+        db.execute('UPDATE community SET `rank` = `rank` + 1 WHERE points < ? AND user_id != ?', (new, user_id))
+    elif new > old:
+        db.execute('UPDATE community SET `rank` = `rank` + 1 WHERE points >= ? AND points < ? AND user_id != ?',
+                   (old, new, user_id))
+    elif new < old:
+        db.execute('UPDATE community SET `rank` = `rank` - 1 WHERE points >= ? AND points < ? AND user_id != ?',
+                   (new, old, user_id))
+    if current is None:
+        rank = db.execute('SELECT COUNT(*) FROM community WHERE points > ?', (new,)).fetchone()[0] + 1
+    else:
+        # Users in (low, high] were above the user and now aren't, or the other way round
+        low, high = min(old, new), max(old, new)
+        passed = db.execute('SELECT COUNT(*) FROM community WHERE points > ? AND points <= ? AND user_id != ?',
+                            (low, high, user_id)).fetchone()[0]
+        rank = current - passed if new > old else current + passed
+    db.execute('UPDATE community SET `rank` = ? WHERE user_id = ?', (rank, user_id))
+
+
+def recompute_ranks(db):
+    """Rewrite every persisted rank from scratch (migration backfill / repair)"""
+    rows = db.execute('SELECT user_id, COALESCE(points, 0) FROM community ORDER BY points DESC').fetchall()
+    updates = []
+    rank = 0
+    previous = None
+    for position, (user_id, points) in enumerate(rows, 1):
+        if points != previous:
+            rank, previous = position, points
+        updates.append((rank, user_id))
+    if updates:
+        db.executemany('UPDATE community SET `rank` = ? WHERE user_id = ?', updates)
+
+
+class Leaderboard:
+    """
+    Sorted in-memory index of (user_id -> points), shared by request threads.
+    Writes made by this process are applied immediately with record(); the
+    whole index is reloaded after `ttl` seconds to pick up other workers' writes.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._keys = []      # sorted (-points, user_id)
+        self._points = {}    # user_id -> points
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _ensure_loaded(self, db):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        # Read in points order off idx_community_points, so the sort below is a near-linear merge
+        rows = db.execute('SELECT user_id, COALESCE(points, 0) FROM community ORDER BY points DESC').fetchall()
+        points = {user_id: total for user_id, total in rows if user_id is not None}
+        keys = sorted((-total, user_id) for user_id, total in points.items())
+        with self._lock:
+            self._points, self._keys = points, keys
+            self._loaded_at = time.monotonic()
+            self.reloads += 1
+
+    def record(self, user_id, points):
+        """Apply a committed point total to the index (O(log n) search + list insert)"""
+        with self._lock:
+            old = self._points.get(user_id)
+            if old is not None:
+                index = bisect.bisect_left(self._keys, (-old, user_id))
+                if index < len(self._keys) and self._keys[index] == (-old, user_id):
+                    del self._keys[index]
+            self._points[user_id] = points
+            bisect.insort(self._keys, (-points, user_id))
+
+    def rank(self, db, user_id):
+        """
+        Returns:
+            (rank, points, total_users), or None if the user has no community row
+        """
+        self._ensure_loaded(db)
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            # Number of entries with strictly more points
+            above = bisect.bisect_left(self._keys, (-points,))
+            return above + 1, points, len(self._keys)
+
+    def top(self, db, limit=10, offset=0):
+        """
+        One page of the leaderboard
+        Returns:
+            List of dicts with user_id, name, points and rank
+        """
+        self._ensure_loaded(db)
+        with self._lock:
+            page = self._keys[offset:offset + limit]
+            ranks = [bisect.bisect_left(self._keys, (neg_points,)) + 1 for neg_points, _ in page]
+        if not page:
+            return []
+        ids = [user_id for _, user_id in page]
+        names = dict(db.execute(f'SELECT id, name FROM users WHERE id IN ({",".join("?" * len(ids))})',
+                                tuple(ids)).fetchall())
+        return [{'user_id': user_id, 'name': names.get(user_id), 'points': -neg_points, 'rank': rank}
+                for (neg_points, user_id), rank in zip(page, ranks)]
+
+    def size(self):
+        return len(self._keys)
+
+    def stats(self):
+        return {'users': len(self._keys), 'reloads': self.reloads, 'ttl': self.ttl}
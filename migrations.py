@@ -0,0 +1,271 @@
+"""
+Schema Migrations
+Versioned, run-once schema changes recorded in the schema_version table.
+Runs once at process startup (or via `flask --app app migrate`) so request
+handlers never have to check for tables themselves.
+"""
+import os
+import re
+
+import rollups
+import leaderboard
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), 'sql')
+SCHEMA_FILES = {'sqlite': 'sqlite_schema.sql', 'mysql': 'mysql_schema.sql'}
+LOCK_NAME = 'fitness_planner_migrations'
+
+
+def schema_tables(dialect):
+    """CREATE TABLE statements from the dialect's schema file, made idempotent"""
+    with open(os.path.join(SQL_DIR, SCHEMA_FILES[dialect]), 'r') as f:
+        script = '\n'.join(line for line in f.read().splitlines() if not line.strip().startswith('--'))
+    statements = [s.strip() for s in script.split(';')]
+    return [re.sub(r'^CREATE TABLE\s+', 'CREATE TABLE IF NOT EXISTS ', s)
+            for s in statements if s.upper().startswith('CREATE TABLE')]
+
+
+def create_tables(conn, dialect, *names):
+    """Create only the named tables from the schema file (no-op for ones that exist)"""
+    for statement in schema_tables(dialect):
+        if re.match(r'CREATE TABLE IF NOT EXISTS\s+`?(\w+)', statement).group(1) in names:
+            conn.execute(statement)
+
+
+def has_index(conn, dialect, table, name):
+    if dialect == 'mysql':
+        row = conn.execute('SELECT 1 FROM information_schema.statistics '
+                           'WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ? LIMIT 1',
+                           (table, name)).fetchone()
+    else:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def has_column(conn, dialect, table, column):
+    if dialect == 'mysql':
+        row = conn.execute('SELECT 1 FROM information_schema.columns '
+                           'WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ? LIMIT 1',
+                           (table, column)).fetchone()
+        return row is not None
+    return any(r[1] == column for r in conn.execute(f'PRAGMA table_info({table})').fetchall())
+
+
+def drop_index(conn, dialect, table, name):
+    if not has_index(conn, dialect, table, name):
+        return
+    if dialect == 'mysql':
+        conn.execute(f'DROP INDEX {name} ON {table}')
+    else:
+        conn.execute(f'DROP INDEX {name}')
+
+
+def create_index(conn, dialect, name, table, columns, unique=False):
+    """CREATE INDEX that is safe to re-run on both backends"""
+    if has_index(conn, dialect, table, name):
+        return
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    conn.execute(f'CREATE {kind} {name} ON {table} ({columns})')
+
+
+# --- Migrations ----------------------------------------------------------------
+# Each migration must be safe on databases that already have part of the change
+# (older databases were patched ad hoc before versions were tracked).
+
+def _m001_base_tables(conn, dialect):
+    for statement in schema_tables(dialect):
+        conn.execute(statement)
+
+
+def _m002_per_user_indexes(conn, dialect):
+    for name, table, columns in (
+        ('idx_workout_user_date', 'workout', 'user_id, date'),
+        ('idx_diet_user_date', 'diet', 'user_id, date'),
+        ('idx_progress_user_date', 'progress', 'user_id, date'),
+        ('idx_wearabled_user_recorded', 'wearabled', 'user_id, recorded_at'),
+        ('idx_community_user', 'community', 'user_id'),
+        ('idx_community_points', 'community', 'points'),
+        ('idx_schedule_user_status_date', 'workout_schedule', 'user_id, status, scheduled_date'),
+        ('idx_schedule_user_date', 'workout_schedule', 'user_id, scheduled_date'),
+        ('idx_challenges_end_date', 'challenges', 'end_date'),
+        ('idx_user_challenges_user_challenge', 'user_challenges', 'user_id, challenge_id'),
+        ('idx_user_challenges_challenge', 'user_challenges', 'challenge_id'),
+    ):
+        create_index(conn, dialect, name, table, columns)
+
+
+def _m003_unique_wearable_readings(conn, dialect):
+    # Keep the first copy of each (user_id, recorded_at) reading, then enforce uniqueness
+    conn.execute('''
+        DELETE FROM wearabled WHERE id NOT IN (
+            SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM wearabled GROUP BY user_id, recorded_at) AS keep
+        )
+    ''')
+    create_index(conn, dialect, 'uq_wearabled_user_recorded', 'wearabled', 'user_id, recorded_at', unique=True)
+    drop_index(conn, dialect, 'wearabled', 'idx_wearabled_user_recorded')
+
+
+def _m004_wearable_rollups(conn, dialect):
+    create_tables(conn, dialect, 'wearable_daily', 'wearable_weekly')
+    rollups.rebuild(conn)
+
+
+def _m005_sleep_state(conn, dialect):
+    create_tables(conn, dialect, 'sleep_state')
+    rollups.rebuild_sleep_state(conn)
+
+
+def _m006_schedule_adjustment_marker(conn, dialect):
+    # Marks workouts the nightly adjustment already changed, so re-runs don't shrink them again
+    if not has_column(conn, dialect, 'workout_schedule', 'adjusted_on'):
+        conn.execute('ALTER TABLE workout_schedule ADD COLUMN adjusted_on DATE')
+    if not has_column(conn, dialect, 'workout_schedule', 'adjustment_note'):
+        kind = 'VARCHAR(255)' if dialect == 'mysql' else 'TEXT'
+        conn.execute(f'ALTER TABLE workout_schedule ADD COLUMN adjustment_note {kind}')
+
+
+def _m007_leaderboard_ranks(conn, dialect):
+    # community.rank was never maintained; from here on points.award keeps it current
+    leaderboard.recompute_ranks(conn)
+
+
+def _m008_points_ledger(conn, dialect):
+    # Merge duplicate community rows (from the old read-modify-write award) before enforcing one per user
+    for user_id, keep_id, total in conn.execute(
+            'SELECT user_id, MIN(id), SUM(COALESCE(points, 0)) FROM community '
+            'WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > 1').fetchall():
+        conn.execute('UPDATE community SET points = ? WHERE id = ?', (total, keep_id))
+        conn.execute('DELETE FROM community WHERE user_id = ? AND id != ?', (user_id, keep_id))
+    create_index(conn, dialect, 'uq_community_user', 'community', 'user_id', unique=True)
+    drop_index(conn, dialect, 'community', 'idx_community_user')
+    create_tables(conn, dialect, 'points_events')
+    create_index(conn, dialect, 'uq_points_events_source', 'points_events', 'user_id, reason, source_id', unique=True)
+    create_index(conn, dialect, 'idx_points_events_user_created', 'points_events', 'user_id, created_at')
+    # Existing totals become each user's opening ledger row, so the ledger always sums to community.points
+    if not conn.execute('SELECT 1 FROM points_events LIMIT 1').fetchone():
+        conn.execute("INSERT INTO points_events (user_id, delta, reason) "
+                     "SELECT user_id, points, 'opening_balance' FROM community "
+                     "WHERE user_id IS NOT NULL AND points IS NOT NULL AND points != 0")
+    leaderboard.recompute_ranks(conn)
+
+
+def _m009_challenge_participant_count(conn, dialect):
+    # Maintained by join_challenge, so /challenges no longer counts participations per view
+    if not has_column(conn, dialect, 'challenges', 'participant_count'):
+        conn.execute('ALTER TABLE challenges ADD COLUMN participant_count INTEGER DEFAULT 0')
+    conn.execute('UPDATE challenges SET participant_count = '
+                 '(SELECT COUNT(DISTINCT uc.user_id) FROM user_challenges uc WHERE uc.challenge_id = challenges.id)')
+    # Lets the active-challenges page walk challenges newest first and stop after one page
+    create_index(conn, dialect, 'idx_challenges_start_end', 'challenges', 'start_date, end_date')
+
+
+def _m010_unique_challenge_participation(conn, dialect):
+    # Keep one row per (user, challenge): a completed one if any (its payout is keyed by that id), else the first
+    for user_id, challenge_id in conn.execute('SELECT user_id, challenge_id FROM user_challenges '
+                                              'GROUP BY user_id, challenge_id HAVING COUNT(*) > 1').fetchall():
+        rows = conn.execute('SELECT id, status, progress_value FROM user_challenges '
+                            'WHERE user_id = ? AND challenge_id = ? ORDER BY id', (user_id, challenge_id)).fetchall()
+        keep = next((r for r in rows if r[1] == 'completed'), rows[0])
+        conn.execute('UPDATE user_challenges SET progress_value = ? WHERE id = ?',
+                     (max(r[2] or 0 for r in rows), keep[0]))
+        conn.execute('DELETE FROM user_challenges WHERE user_id = ? AND challenge_id = ? AND id != ?',
+                     (user_id, challenge_id, keep[0]))
+    create_index(conn, dialect, 'uq_user_challenges_user_challenge', 'user_challenges', 'user_id, challenge_id',
+                 unique=True)
+    drop_index(conn, dialect, 'user_challenges', 'idx_user_challenges_user_challenge')
+    conn.execute('UPDATE challenges SET participant_count = '
+                 '(SELECT COUNT(*) FROM user_challenges uc WHERE uc.challenge_id = challenges.id)')
+
+
+def _m011_profile_version(conn, dialect):
+    # Bumped by every profile edit; sessions carry it so cached profiles can be checked without a read
+    if not has_column(conn, dialect, 'users', 'profile_version'):
+        conn.execute('ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 0')
+
+
+def _m012_nightly_sleep_rollups(conn, dialect):
+    # wearable_daily summed sleep_hours over a day's readings; it is now the night's hours (MAX)
+    rollups.rebuild(conn)
+    rollups.rebuild_sleep_state(conn)
+
+
+def _m013_points_keys(conn, dialect):
+    # Award keys move out of points_events so compacting the ledger can't forget what was paid
+    create_tables(conn, dialect, 'points_keys')
+    conn.execute("INSERT OR IGNORE INTO points_keys (user_id, reason, source_id) "
+                 "SELECT user_id, reason, source_id FROM points_events "
+                 "WHERE source_id IS NOT NULL AND reason != 'compacted'")
+    drop_index(conn, dialect, 'points_events', 'uq_points_events_source')
+
+
+MIGRATIONS = (
+    (1, 'base tables', _m001_base_tables),
+    (2, 'per-user composite indexes', _m002_per_user_indexes),
+    (3, 'unique wearable readings per user and timestamp', _m003_unique_wearable_readings),
+    (4, 'daily and weekly wearable rollups', _m004_wearable_rollups),
+    (5, 'persisted sleep quality state', _m005_sleep_state),
+    (6, 'schedule adjustment marker', _m006_schedule_adjustment_marker),
+    (7, 'leaderboard ranks', _m007_leaderboard_ranks),
+    (8, 'points ledger and one community row per user', _m008_points_ledger),
+    (9, 'challenge participant counter', _m009_challenge_participant_count),
+    (10, 'unique challenge participation per user', _m010_unique_challenge_participation),
+    (11, 'user profile version stamp', _m011_profile_version),
+    (12, 'nightly sleep in wearable rollups', _m012_nightly_sleep_rollups),
+    (13, 'points award keys kept apart from the ledger', _m013_points_keys),
+)
+
+
+# --- Runner --------------------------------------------------------------------
+
+def _ensure_version_table(conn, dialect):
+    if dialect == 'mysql':
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY, '
+                     'description VARCHAR(255), applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP) ENGINE=InnoDB')
+    else:
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, '
+                     'description TEXT, applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)')
+    conn.commit()
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version').fetchall()}
+
+
+def run_migrations(conn, dialect):
+    """
+    Apply every migration newer than what the database has recorded
+    Args:
+        conn: Open connection (sqlite3 or db.MySQLConnection)
+        dialect: 'sqlite' or 'mysql'
+    Returns:
+        List of versions applied by this call
+    """
+    _ensure_version_table(conn, dialect)
+    if dialect == 'mysql':
+        # DDL auto-commits in MySQL, so serialize workers with a named lock instead
+        conn.execute('SELECT GET_LOCK(?, 60)', (LOCK_NAME,)).fetchone()
+    applied = []
+    try:
+        done = applied_versions(conn)
+        for version, description, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            if dialect == 'sqlite':
+                # Takes the write lock: a concurrent worker waits, then sees the version recorded
+                conn.commit()
+                conn.execute('BEGIN IMMEDIATE')
+                if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                    conn.commit()
+                    continue
+            migrate(conn, dialect)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            conn.commit()
+            applied.append(version)
+            print(f"Applied migration {version}: {description}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if dialect == 'mysql':
+            conn.execute('SELECT RELEASE_LOCK(?)', (LOCK_NAME,)).fetchone()
+            conn.commit()
+    return applied
@@ -1,102 +1,108 @@
 """
 ML-based Recommendation System for Personalized Fitness Planner
-Uses scikit-learn for workout and diet recommendations
+Uses scikit-learn for workout and diet recommendations.
+NumPy and scikit-learn are imported on first use so that importing this
+module (and app.py) stays fast for routes that never touch ML.
 """
-import numpy as np
+import importlib.util
 from datetime import datetime, timedelta
 
-try:
-    from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
-    from sklearn.preprocessing import LabelEncoder
-    from sklearn.model_selection import train_test_split
-    import pandas as pd
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
+# Only check that the packages are installed; importing them costs about a second
+ML_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('numpy', 'sklearn'))
+if not ML_AVAILABLE:
     print("Warning: scikit-learn not available. Using fallback recommendations.")
 
 
+ACTIVITY_LEVELS = {'sedentary': 1, 'light': 2, 'moderate': 3, 'active': 4, 'very active': 5}
+
+
+def profile_features(user_data):
+    """Constant per-user features shared by every training row and prediction"""
+    activity_level = user_data.get('activity_level', 'Moderate').lower()
+    return [
+        user_data.get('age', 25),
+        user_data.get('weight_kg', 70),
+        user_data.get('height_cm', 170),
+        1 if user_data.get('gender') == 'Male' else 0,
+        ACTIVITY_LEVELS.get(activity_level, 3),
+    ]
+
+
+def build_feature_matrices(profile, workout_dates, diet_rows):
+    """
+    Columnar feature builder for the workout and calorie models
+    Args:
+        profile: Output of profile_features, broadcast to every row
+        workout_dates: datetime64[D] array of workout dates in history order
+        diet_rows: Number of diet rows used as calorie training samples
+    Returns:
+        (X, X_diet) as C-contiguous float64 arrays
+    """
+    import numpy as np
+
+    n = len(workout_dates)
+    X = np.empty((n, 7), dtype=np.float64)
+    X[:, :5] = profile
+    # Days between consecutive workouts (0 for the first row)
+    X[0, 5] = 0
+    X[1:, 5] = np.diff(workout_dates).astype(np.int64)
+    # 1970-01-01 was a Thursday, so shifting by 3 gives Monday=0 like datetime.weekday()
+    X[:, 6] = (workout_dates.astype(np.int64) + 3) % 7
+
+    X_diet = np.empty((diet_rows, 5), dtype=np.float64)
+    X_diet[:] = profile
+    return X, X_diet
+
+
 class FitnessRecommender:
     """ML-based recommendation system for fitness and diet plans"""
     
     def __init__(self):
         self.workout_model = None
         self.calorie_model = None
-        self.workout_encoder = LabelEncoder() if ML_AVAILABLE else None
+        self.workout_encoder = None  # LabelEncoder, created when training
         self.is_trained = False
-    
+
+    def export_state(self):
+        """Return the fitted models and encoder as a picklable dict"""
+        return {
+            'workout_model': self.workout_model,
+            'calorie_model': self.calorie_model,
+            'workout_encoder': self.workout_encoder,
+            'is_trained': self.is_trained
+        }
+
+    def load_state(self, state):
+        """Restore fitted models previously produced by export_state()"""
+        self.workout_model = state.get('workout_model')
+        self.calorie_model = state.get('calorie_model')
+        self.workout_encoder = state.get('workout_encoder', self.workout_encoder)
+        self.is_trained = state.get('is_trained', False)
+
     def prepare_training_data(self, workout_data, diet_data, user_data):
         """
         Prepare training data from historical user data
         Args:
-            workout_data: List of workout records
-            diet_data: List of diet records  
+            workout_data: List of workout records (dicts or records.WorkoutRecord)
+            diet_data: List of diet records (dicts or records.DietRecord)
             user_data: User profile data
         Returns:
             X, y for workout recommendations and calorie predictions
         """
         if not ML_AVAILABLE or not workout_data:
             return None, None, None, None
-        
-        # Prepare features from user data and history
-        features = []
-        workout_targets = []
-        calorie_targets = []
-        
-        for i, workout in enumerate(workout_data):
-            # Feature: user profile + recent activity
-            user_features = [
-                user_data.get('age', 25),
-                user_data.get('weight_kg', 70),
-                user_data.get('height_cm', 170),
-                1 if user_data.get('gender') == 'Male' else 0,
-            ]
-            
-            # Activity level encoding
-            activity_map = {'sedentary': 1, 'light': 2, 'moderate': 3, 'active': 4, 'very active': 5}
-            activity_level = user_data.get('activity_level', 'Moderate').lower()
-            user_features.append(activity_map.get(activity_level, 3))
-            
-            # Recent workout frequency (days between workouts)
-            if i > 0:
-                prev_date = datetime.strptime(workout_data[i-1].get('date', workout_data[0].get('date')), '%Y-%m-%d')
-                curr_date = datetime.strptime(workout.get('date'), '%Y-%m-%d')
-                days_diff = (curr_date - prev_date).days
-                user_features.append(days_diff)
-            else:
-                user_features.append(0)
-            
-            # Day of week
-            workout_date = datetime.strptime(workout.get('date'), '%Y-%m-%d')
-            user_features.append(workout_date.weekday())
-            
-            features.append(user_features)
-            workout_targets.append(workout.get('workout_type', 'Running'))
-            
-            # Calorie target based on workout type and duration
-            base_calories = workout.get('calories_burned', 200)
-            calorie_targets.append(base_calories)
-        
-        # Match diet data for calorie prediction
-        if diet_data:
-            diet_features = []
-            diet_calorie_targets = []
-            
-            for diet in diet_data[:min(len(features), len(diet_data))]:
-                diet_feat = [
-                    user_data.get('age', 25),
-                    user_data.get('weight_kg', 70),
-                    user_data.get('height_cm', 170),
-                    1 if user_data.get('gender') == 'Male' else 0,
-                    activity_map.get(activity_level, 3),
-                ]
-                diet_features.append(diet_feat)
-                diet_calorie_targets.append(diet.get('calories', 500))
-        
-        return (np.array(features) if features else None, 
-                workout_targets if workout_targets else None,
-                np.array(diet_features) if diet_data and diet_features else None,
-                diet_calorie_targets if diet_data and diet_calorie_targets else None)
+        import numpy as np
+
+        # Pull the columns out once, then build features on whole arrays
+        # records.WorkoutRecord carries the date already parsed; plain dicts have the string
+        workout_dates = np.array([getattr(w, 'day', None) or w.get('date') for w in workout_data], dtype='datetime64[D]')
+        workout_targets = [w.get('workout_type', 'Running') for w in workout_data]
+        diet_targets = [d.get('calories', 500) for d in diet_data[:len(workout_data)]] if diet_data else []
+
+        X, X_diet = build_feature_matrices(profile_features(user_data), workout_dates, len(diet_targets))
+        return (X, workout_targets,
+                X_diet if diet_targets else None,
+                diet_targets if diet_targets else None)
     
     def train_models(self, workout_data, diet_data, user_data):
         """Train ML models on user's historical data"""
@@ -113,9 +119,12 @@ class FitnessRecommender:
             
             if X is None or len(X) < 3:  # Need at least 3 samples
                 return False
+            from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
+            from sklearn.preprocessing import LabelEncoder
             
             # Encode workout types
             if workout_targets:
+                self.workout_encoder = LabelEncoder()
                 workout_targets_encoded = self.workout_encoder.fit_transform(workout_targets)
                 
                 # Train workout type classifier
@@ -149,17 +158,11 @@ class FitnessRecommender:
             return self._fallback_workout_recommendation(user_data, recent_activity)
         
         try:
+            import numpy as np
+
             # Prepare features
-            activity_map = {'sedentary': 1, 'light': 2, 'moderate': 3, 'active': 4, 'very active': 5}
-            activity_level = user_data.get('activity_level', 'Moderate').lower()
-            
             today = datetime.now()
-            features = np.array([[
-                user_data.get('age', 25),
-                user_data.get('weight_kg', 70),
-                user_data.get('height_cm', 170),
-                1 if user_data.get('gender') == 'Male' else 0,
-                activity_map.get(activity_level, 3),
+            features = np.array([profile_features(user_data) + [
                 recent_activity.get('days_since_last_workout', 1) if recent_activity else 1,
                 today.weekday()
             ]])
@@ -185,16 +188,9 @@ class FitnessRecommender:
             return self._fallback_calorie_recommendation(user_data, goal)
         
         try:
-            activity_map = {'sedentary': 1, 'light': 2, 'moderate': 3, 'active': 4, 'very active': 5}
-            activity_level = user_data.get('activity_level', 'Moderate').lower()
-            
-            features = np.array([[
-                user_data.get('age', 25),
-                user_data.get('weight_kg', 70),
-                user_data.get('height_cm', 170),
-                1 if user_data.get('gender') == 'Male' else 0,
-                activity_map.get(activity_level, 3),
-            ]])
+            import numpy as np
+
+            features = np.array([profile_features(user_data)])
             
             base_calories = self.calorie_model.predict(features)[0]
             
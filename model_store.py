@@ -0,0 +1,175 @@
+"""
+Persistent Model Store for the ML Recommender
+Keeps fitted per-user FitnessRecommender models on disk and in a small
+in-memory LRU so /recommendations only retrains when the user's data changes
+"""
+import os
+import pickle
+import hashlib
+import itertools
+import threading
+
+from ml_recommender import FitnessRecommender
+
+
+def data_fingerprint(db, user_id, user_data):
+    """
+    Build a fingerprint of everything the models are trained on
+    Args:
+        db: Open database connection
+        user_id: User id
+        user_data: User profile dict
+    Returns:
+        Short hex string that changes whenever workout/diet rows or the profile change
+    """
+    row = db.execute('''
+        SELECT (SELECT COUNT(*) FROM workout WHERE user_id = ?),
+               (SELECT MAX(id) FROM workout WHERE user_id = ?),
+               (SELECT COUNT(*) FROM diet WHERE user_id = ?),
+               (SELECT MAX(id) FROM diet WHERE user_id = ?)
+    ''', (user_id, user_id, user_id, user_id)).fetchone()
+    profile = tuple(user_data.get(k) for k in ('age', 'weight_kg', 'height_cm', 'gender', 'activity_level'))
+    raw = repr((tuple(row), profile)).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+class _Entry:
+    """One published model; the recommender is never mutated after publication, only replaced"""
+    __slots__ = ('fingerprint', 'recommender', 'size', 'last_used')
+
+    def __init__(self, fingerprint, recommender, size, last_used):
+        self.fingerprint = fingerprint
+        self.recommender = recommender
+        self.size = size
+        self.last_used = last_used
+
+
+class ModelStore:
+    """
+    Thread-safe registry of trained recommenders keyed by user id and data fingerprint.
+    Each user gets their own FitnessRecommender instance. The prediction path
+    (get) takes no lock: published recommenders are immutable and are swapped
+    in whole, so readers either see the old model or the new one.
+    """
+
+    def __init__(self, model_dir, max_in_memory=128, max_bytes=64 * 1024 * 1024):
+        self.model_dir = model_dir
+        self.max_in_memory = max_in_memory
+        self.max_bytes = max_bytes
+        self._entries = {}  # user_id -> _Entry
+        self._bytes = 0
+        self._lock = threading.Lock()  # guards publication and eviction only
+        self._train_locks = [threading.Lock() for _ in range(32)]
+        self._clock = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, user_id):
+        return os.path.join(self.model_dir, f'user_{int(user_id)}.pkl')
+
+    def get(self, user_id, fingerprint):
+        """
+        Return the trained recommender for a user if it matches the fingerprint
+        Args:
+            user_id: User id
+            fingerprint: Result of data_fingerprint for the user's current data
+        Returns:
+            FitnessRecommender or None if the user needs (re)training
+        """
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.fingerprint == fingerprint:
+            entry.last_used = next(self._clock)  # approximate LRU, races are harmless
+            self.hits += 1
+            return entry.recommender
+        self.misses += 1
+        return self._load_from_disk(user_id, fingerprint)[1]
+
+    def latest(self, user_id):
+        """
+        Return the most recently published recommender for a user, even if its data is stale
+        Returns:
+            (fingerprint, FitnessRecommender) or (None, None) if the user was never trained
+        """
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry.last_used = next(self._clock)
+            self.hits += 1
+            return entry.fingerprint, entry.recommender
+        self.misses += 1
+        return self._load_from_disk(user_id)
+
+    def get_or_train(self, user_id, fingerprint, train):
+        """
+        Return the user's recommender, training it at most once per fingerprint
+        Args:
+            user_id: User id
+            fingerprint: Result of data_fingerprint
+            train: Callable returning a trained FitnessRecommender or None
+        Returns:
+            FitnessRecommender or None if training was not possible
+        """
+        recommender = self.get(user_id, fingerprint)
+        if recommender is not None:
+            return recommender
+        # Concurrent requests for the same user wait for one fit instead of each running their own
+        with self._train_locks[hash(user_id) % len(self._train_locks)]:
+            recommender = self.get(user_id, fingerprint)
+            if recommender is None:
+                recommender = train()
+                if recommender is not None:
+                    self.put(user_id, fingerprint, recommender)
+        return recommender
+
+    def put(self, user_id, fingerprint, recommender):
+        """Publish a freshly trained recommender in memory and persist it to disk"""
+        blob = pickle.dumps({'fingerprint': fingerprint, 'state': recommender.export_state()},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        self._publish(user_id, fingerprint, recommender, len(blob))
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            path = self._path(user_id)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)  # atomic, readers never see a half-written file
+        except Exception as e:
+            print(f"Error saving model for user {user_id}: {e}")
+
+    def stats(self):
+        """Return cache counters for sizing the in-memory budget"""
+        return {'entries': len(self._entries), 'bytes': self._bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+    def _load_from_disk(self, user_id, fingerprint=None):
+        # Returns (fingerprint, recommender); any fingerprint is accepted when none is given
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            payload = pickle.loads(blob)
+        except Exception as e:
+            print(f"Error loading model for user {user_id}: {e}")
+            return None, None
+        if fingerprint is not None and payload.get('fingerprint') != fingerprint:
+            return None, None
+
+        recommender = FitnessRecommender()
+        recommender.load_state(payload['state'])
+        self._publish(user_id, payload.get('fingerprint'), recommender, len(blob))
+        return payload.get('fingerprint'), recommender
+
+    def _publish(self, user_id, fingerprint, recommender, size):
+        entry = _Entry(fingerprint, recommender, size, next(self._clock))
+        with self._lock:
+            old = self._entries.get(user_id)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[user_id] = entry
+            self._bytes += size
+            # Evict least recently used models until we are back under both limits
+            while len(self._entries) > 1 and (len(self._entries) > self.max_in_memory
+                                              or self._bytes > self.max_bytes):
+                victim = min(self._entries, key=lambda uid: self._entries[uid].last_used)
+                self._bytes -= self._entries.pop(victim).size
@@ -0,0 +1,167 @@
+"""
+Nightly Schedule Adjustment
+Runs DynamicAdjuster over every user's pending schedule in one batch job
+(`flask --app app adjust-schedules`). Users are streamed in id-ordered chunks;
+each chunk is loaded with set-based queries, adjusted, and written back with a
+single executemany, and chunks run in parallel across a process pool.
+"""
+import os
+import time
+from datetime import date, datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import rollups
+from db import connect
+from dynamic_adjuster import DynamicAdjuster
+from records import ScheduleRecord, UserProfile
+
+CHUNK_SIZE = 500
+NO_SLEEP_DATA = {'quality': 'unknown', 'score': 0.8}
+
+
+def iter_user_chunks(db, chunk_size=CHUNK_SIZE):
+    """Yield lists of user ids in id order (keyset pagination, so memory is one chunk)"""
+    last_id = 0
+    while True:
+        ids = [row[0] for row in db.execute('SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?',
+                                            (last_id, chunk_size)).fetchall()]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _placeholders(ids):
+    return ','.join('?' * len(ids))
+
+
+def load_chunk(db, user_ids):
+    """
+    Everything the adjuster needs for a chunk of users, one IN (...) query per table
+    Returns:
+        (users, schedules, workout_dates, last_workout, sleep) keyed by user id
+    """
+    user_ids = tuple(user_ids)
+    marks = _placeholders(user_ids)
+    users = {user.id: user for user in
+             UserProfile.from_rows(db.execute(f'SELECT * FROM users WHERE id IN ({marks})', user_ids).fetchall())}
+    schedules = defaultdict(list)
+    for record in ScheduleRecord.from_rows(db.execute(f'SELECT * FROM workout_schedule WHERE user_id IN ({marks}) '
+                                                      f'ORDER BY user_id, scheduled_date', user_ids).fetchall()):
+        schedules[record.user_id].append(record)
+    # Skip detection only compares dates, so only load workout dates the schedules can match
+    earliest = min((s.scheduled_date for rows in schedules.values() for s in rows), default=None)
+    workout_dates = defaultdict(list)
+    last_workout = {}
+    if earliest is not None:
+        for user_id, day in db.execute(f'SELECT DISTINCT user_id, date FROM workout '
+                                       f'WHERE user_id IN ({marks}) AND date >= ?',
+                                       user_ids + (earliest,)).fetchall():
+            workout_dates[user_id].append({'date': day})
+        for user_id, day in db.execute(f'SELECT user_id, MAX(date) FROM workout WHERE user_id IN ({marks}) '
+                                       f'GROUP BY user_id', user_ids).fetchall():
+            last_workout[user_id] = day
+    sleep = rollups.sleep_quality_many(db, user_ids)
+    return users, schedules, workout_dates, last_workout, sleep
+
+
+def plan_updates(adjuster, user, schedule, workouts, last_workout, sleep_quality, today):
+    """
+    Run skip detection and adjustment for one user
+    Only future pending workouts that were never adjusted are changed, so
+    re-running the job on the same night (or the next) does not compound.
+    Returns:
+        (updates, skipped_count) where updates are (duration_min, workout_type, note, adjusted_on, id)
+    """
+    skipped = adjuster.detect_skipped_workouts(schedule, workouts)
+    candidates = [s for s in schedule if s.status == 'pending' and not s.adjusted_on
+                  and s.scheduled_date >= today and s.duration_min is not None]
+    if not candidates:
+        return [], len(skipped['skipped'])
+    recent_activity = {}
+    if last_workout:
+        last = datetime.strptime(str(last_workout)[:10], '%Y-%m-%d').date()
+        recent_activity = {'days_since_last_workout': (date.fromisoformat(today) - last).days}
+    result = adjuster.adjust_workout_schedule(user, skipped, sleep_quality, candidates, recent_activity)
+    updates = []
+    for original, modified in zip(candidates, result['modified_schedule']):
+        if (modified.duration_min, modified.workout_type) != (original.duration_min, original.workout_type):
+            updates.append((modified.duration_min, modified.workout_type, modified.note, today, original.id))
+    return updates, len(skipped['skipped'])
+
+
+def adjust_chunk(db_config, user_ids, today=None):
+    """
+    Adjust one chunk of users (runs inside a worker process)
+    Returns:
+        Stats dict: users, adjusted, rest_days, skipped, seconds
+    """
+    started = time.perf_counter()
+    today = today or date.today().isoformat()
+    adjuster = DynamicAdjuster()
+    conn = connect(db_config)
+    try:
+        users, schedules, workout_dates, last_workout, sleep = load_chunk(conn, user_ids)
+        updates = []
+        skipped = 0
+        for user_id, user in users.items():
+            if not schedules.get(user_id):
+                continue
+            user_updates, user_skipped = plan_updates(
+                adjuster, user, schedules[user_id], workout_dates.get(user_id, []),
+                last_workout.get(user_id), sleep.get(user_id, NO_SLEEP_DATA), today)
+            updates.extend(user_updates)
+            skipped += user_skipped
+        if updates:
+            conn.executemany('UPDATE workout_schedule SET duration_min = ?, workout_type = ?, adjustment_note = ?, '
+                             'adjusted_on = ? WHERE id = ? AND adjusted_on IS NULL', updates)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'users': len(user_ids), 'adjusted': len(updates),
+            'rest_days': sum(1 for u in updates if u[1] == 'Rest Day'), 'skipped': skipped,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def run(db, db_config, chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    """
+    Adjust every user's schedule
+    Args:
+        db: Connection used to page through user ids
+        db_config: Picklable config (db.config_from_env) for worker connections
+        chunk_size: Users per chunk
+        workers: Processes in the pool (None = one per CPU, 0 = run chunks inline)
+        progress: Optional callable receiving each chunk's stats dict
+    Returns:
+        Totals dict with users, adjusted, rest_days, skipped, seconds and users_per_sec
+    """
+    totals = {'users': 0, 'adjusted': 0, 'rest_days': 0, 'skipped': 0, 'chunks': 0}
+    started = time.perf_counter()
+    today = date.today().isoformat()
+
+    def collect(stats):
+        for key in ('users', 'adjusted', 'rest_days', 'skipped'):
+            totals[key] += stats[key]
+        totals['chunks'] += 1
+        if progress:
+            progress(stats)
+
+    if workers == 0:
+        for user_ids in iter_user_chunks(db, chunk_size):
+            collect(adjust_chunk(db_config, user_ids, today))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded number of chunks in flight so user ids are streamed, not all queued up front
+            limit = 2 * workers
+            pending = []
+            for user_ids in iter_user_chunks(db, chunk_size):
+                pending.append(pool.submit(adjust_chunk, db_config, user_ids, today))
+                if len(pending) >= limit:
+                    collect(pending.pop(0).result())
+            for future in pending:
+                collect(future.result())
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    totals['users_per_sec'] = int(totals['users'] / totals['seconds']) if totals['seconds'] else None
+    return totals
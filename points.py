@@ -0,0 +1,84 @@
+"""
+Points Ledger
+Every award is appended to points_events and added to community.points in the
+caller's transaction. The total is changed with a single-statement increment
+(never read, add and write back), so concurrent completions cannot lose points.
+Keyed awards also claim (user_id, reason, source_id) in points_keys, so one
+event is only paid once. compact() folds old ledger rows into one balance row
+per user and leaves points_keys alone, so the guarantee outlives compaction.
+"""
+from datetime import datetime, timedelta
+
+import leaderboard
+
+COMPACTED = 'compacted'
+COMPACT_BATCH_SIZE = 500
+
+
+def add_to_total(db, user_id, delta):
+    """
+    Atomically add delta to a user's community.points, creating the row if needed
+    Returns:
+        (new total, True if this call created the row)
+    """
+    created = False
+    if not db.execute('UPDATE community SET points = COALESCE(points, 0) + ? WHERE user_id = ?',
+                      (delta, user_id)).rowcount:
+        # uq_community_user makes a concurrent first award fall through to the UPDATE
+        created = bool(db.execute('INSERT OR IGNORE INTO community (user_id, points) VALUES (?, 0)',
+                                  (user_id,)).rowcount)
+        db.execute('UPDATE community SET points = COALESCE(points, 0) + ? WHERE user_id = ?', (delta, user_id))
+    return db.execute('SELECT points FROM community WHERE user_id = ?', (user_id,)).fetchone()[0], created
+
+
+def award(db, user_id, delta, reason, source_id=None):
+    """
+    Record a point award and apply it to the user's total and rank
+    Runs inside the caller's transaction (the caller commits, then calls Leaderboard.record).
+    Args:
+        db: Open connection
+        user_id: User receiving the points
+        delta: Points to add (may be negative)
+        reason: Short event kind, e.g. 'schedule' or 'challenge'
+        source_id: Id of the row that earned the points; with reason it makes the award idempotent
+    Returns:
+        The user's new total, or None if this (reason, source_id) was already awarded
+    """
+    if source_id is not None and not db.execute(
+            'INSERT OR IGNORE INTO points_keys (user_id, reason, source_id) VALUES (?, ?, ?)',
+            (user_id, reason, source_id)).rowcount:
+        return None
+    db.execute('INSERT INTO points_events (user_id, delta, reason, source_id) VALUES (?, ?, ?, ?)',
+               (user_id, delta, reason, source_id))
+    new, created = add_to_total(db, user_id, delta)
+    leaderboard.update_ranks(db, user_id, None if created else new - delta, new)
+    return new
+
+
+def compact(db, older_than_days=90, batch_size=COMPACT_BATCH_SIZE, now=None):
+    """
+    Fold each user's ledger rows older than the cutoff into a single 'compacted' row
+    Totals and the points_keys that make awards idempotent are unchanged. Users are processed in id order, batch_size users per
+    transaction, so the ledger stays writable while the job runs.
+    Returns:
+        dict with users, events_removed and batches
+    """
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+    totals = {'users': 0, 'events_removed': 0, 'batches': 0}
+    last_user = 0
+    while True:
+        groups = db.execute('SELECT user_id, COUNT(*), SUM(delta), MAX(id), MAX(created_at) FROM points_events '
+                            'WHERE user_id > ? AND created_at < ? GROUP BY user_id HAVING COUNT(*) > 1 '
+                            'ORDER BY user_id LIMIT ?', (last_user, cutoff, batch_size)).fetchall()
+        if not groups:
+            break
+        db.executemany('DELETE FROM points_events WHERE user_id = ? AND created_at < ? AND id <= ?',
+                       [(g[0], cutoff, g[3]) for g in groups])
+        db.executemany('INSERT INTO points_events (user_id, delta, reason, created_at) VALUES (?, ?, ?, ?)',
+                       [(g[0], g[2], COMPACTED, g[4]) for g in groups])
+        db.commit()
+        totals['users'] += len(groups)
+        totals['events_removed'] += sum(g[1] - 1 for g in groups)
+        totals['batches'] += 1
+        last_user = groups[-1][0]
+    return totals
@@ -0,0 +1,156 @@
+"""
+Row Records
+Compact __slots__ records for the user profile and the workout, diet and
+schedule rows that flow into DynamicAdjuster and FitnessRecommender. Dates are parsed once when the
+rows are loaded, and records keep the dict-style access (record['date'],
+record.get('date'), record.copy()) that the adjuster and templates already use.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _parse_day_string(value):
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def parse_day(value):
+    """'YYYY-MM-DD...' (or a date) to a date; None if missing or malformed"""
+    if value is None or isinstance(value, date):
+        return value.date() if isinstance(value, datetime) else value
+    # Rows share a small set of dates, so each distinct string is parsed once
+    return _parse_day_string(str(value))
+
+
+class Record:
+    """Base class: FIELDS are the columns, DERIVED are attributes computed at load"""
+    __slots__ = ()
+    FIELDS = ()
+    DERIVED = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+        for name in self.FIELDS[len(values):]:
+            setattr(self, name, None)
+        self._derive()
+
+    @classmethod
+    def _new(cls, values):
+        # Fast path for from_rows: values has exactly one entry per field
+        record = object.__new__(cls)
+        for name, value in zip(cls.FIELDS, values):
+            object.__setattr__(record, name, value)
+        record._derive()
+        return record
+
+    def _derive(self):
+        pass
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build records from DB rows (sqlite3.Row / db.Row), looking up column positions once
+        Columns the row doesn't have are left as None.
+        """
+        records = []
+        positions = None
+        for row in rows:
+            if positions is None:
+                index = {name: i for i, name in enumerate(row.keys())}
+                positions = [index.get(name) for name in cls.FIELDS]
+            records.append(cls._new([row[i] if i is not None else None for i in positions]))
+        return records
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*[data.get(name) for name in cls.FIELDS])
+
+    # dict-style access, so code written against dict(row) keeps working
+    def __getitem__(self, key):
+        if key in self.FIELDS or key in self.DERIVED:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        if key in self.FIELDS or key in self.DERIVED:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.FIELDS]
+
+    def copy(self):
+        clone = object.__new__(type(self))
+        for name in self.FIELDS + self.DERIVED:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class UserProfile(Record):
+    """A users row without credentials; what routes, caches and both engines pass around as user_data"""
+    __slots__ = ('id', 'name', 'email', 'age', 'gender', 'height_cm', 'weight_kg', 'activity_level',
+                 'created_at', 'profile_version')
+    FIELDS = ('id', 'name', 'email', 'age', 'gender', 'height_cm', 'weight_kg', 'activity_level',
+              'created_at', 'profile_version')
+
+
+class WorkoutRecord(Record):
+    __slots__ = ('id', 'user_id', 'date', 'workout_type', 'duration_min', 'calories_burned', 'notes', 'day')
+    FIELDS = ('id', 'user_id', 'date', 'workout_type', 'duration_min', 'calories_burned', 'notes')
+    DERIVED = ('day',)
+
+    def _derive(self):
+        self.day = parse_day(self.date)
+
+
+class DietRecord(Record):
+    __slots__ = ('id', 'user_id', 'date', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fats_g', 'notes', 'day')
+    FIELDS = ('id', 'user_id', 'date', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fats_g', 'notes')
+    DERIVED = ('day',)
+
+    def _derive(self):
+        self.day = parse_day(self.date)
+
+
+class ScheduleRecord(Record):
+    # 'note' is not a column; DynamicAdjuster sets it on adjusted copies
+    __slots__ = ('id', 'user_id', 'scheduled_date', 'workout_type', 'duration_min', 'status',
+                 'adjusted_on', 'adjustment_note', 'note', 'day')
+    FIELDS = ('id', 'user_id', 'scheduled_date', 'workout_type', 'duration_min', 'status',
+              'adjusted_on', 'adjustment_note', 'note')
+    DERIVED = ('day',)
+
+    def _derive(self):
+        self.day = parse_day(self.scheduled_date)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key == 'scheduled_date':
+            self._derive()
+
+
+def schedule_day(item):
+    """Parsed scheduled_date of a ScheduleRecord (already parsed) or a plain dict (parsed now)"""
+    day = getattr(item, 'day', None)
+    return day if day is not None else datetime.strptime(item.get('scheduled_date'), '%Y-%m-%d').date()
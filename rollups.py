@@ -0,0 +1,194 @@
+"""
+Wearable Rollups
+Daily and weekly summaries of the raw wearabled samples (total steps, heart
+rate avg/min/max, nightly sleep, calories), plus each user's rolling sleep-quality
+state. They are refreshed for the days a write touches, so page views read
+O(days) rows instead of every device sample.
+"""
+from datetime import datetime, timedelta
+
+from dynamic_adjuster import DynamicAdjuster
+
+SLEEP_WINDOW_DAYS = 7
+_adjuster = DynamicAdjuster()
+
+# Aggregates over wearabled rows; heart_rate 0 means "not measured". Every reading
+# carries the whole previous night's sleep (see wearable_ingest), so a day's sleep is
+# the largest value reported, not a sum; segmented reports would be under-counted
+DAILY_AGGREGATES = '''
+    COUNT(*), COALESCE(SUM(steps), 0),
+    SUM(CASE WHEN heart_rate > 0 THEN 1 ELSE 0 END),
+    COALESCE(SUM(CASE WHEN heart_rate > 0 THEN heart_rate ELSE 0 END), 0),
+    MIN(CASE WHEN heart_rate > 0 THEN heart_rate END),
+    MAX(CASE WHEN heart_rate > 0 THEN heart_rate END),
+    COALESCE(MAX(sleep_hours), 0), COALESCE(SUM(calories_burned), 0)
+'''
+DAILY_COLUMNS = 'user_id, day, samples, steps, hr_samples, hr_total, hr_min, hr_max, sleep_hours, calories_burned'
+WEEKLY_COLUMNS = 'user_id, week_start, days, samples, steps, hr_samples, hr_total, hr_min, hr_max, sleep_hours, calories_burned'
+
+
+def _day(value):
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def week_start(day):
+    """Monday of the week containing day ('YYYY-MM-DD' or date)"""
+    day = _day(day)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def refresh_day(db, user_id, day):
+    """Recompute one user-day from its raw samples (uses the (user_id, recorded_at) index)"""
+    start = _day(day)
+    db.execute('DELETE FROM wearable_daily WHERE user_id = ? AND day = ?', (user_id, start.isoformat()))
+    # String bounds also match legacy 'YYYY-MM-DDTHH:MM' timestamps from the old form
+    db.execute(f'''
+        INSERT INTO wearable_daily ({DAILY_COLUMNS})
+        SELECT user_id, ?, {DAILY_AGGREGATES} FROM wearabled
+        WHERE user_id = ? AND recorded_at >= ? AND recorded_at < ?
+        GROUP BY user_id
+    ''', (start.isoformat(), user_id, start.isoformat(), (start + timedelta(days=1)).isoformat()))
+
+
+def refresh_week(db, user_id, monday):
+    """Recompute one user-week from its (at most seven) daily rows"""
+    start = _day(monday)
+    db.execute('DELETE FROM wearable_weekly WHERE user_id = ? AND week_start = ?', (user_id, start.isoformat()))
+    db.execute(f'''
+        INSERT INTO wearable_weekly ({WEEKLY_COLUMNS})
+        SELECT user_id, ?, COUNT(*), SUM(samples), SUM(steps), SUM(hr_samples), SUM(hr_total),
+               MIN(hr_min), MAX(hr_max), SUM(sleep_hours), SUM(calories_burned)
+        FROM wearable_daily
+        WHERE user_id = ? AND day >= ? AND day < ?
+        GROUP BY user_id
+    ''', (start.isoformat(), user_id, start.isoformat(), (start + timedelta(days=7)).isoformat()))
+
+
+def refresh(db, user_id, days):
+    """
+    Bring the rollups up to date after wearabled rows were written
+    Runs inside the caller's transaction; the caller commits.
+    Args:
+        db: Open connection
+        user_id: Owner of the written rows
+        days: Iterable of days ('YYYY-MM-DD...' strings) that received rows
+    """
+    days = {str(d)[:10] for d in days}
+    for day in sorted(days):
+        refresh_day(db, user_id, day)
+    for monday in sorted({week_start(d) for d in days}):
+        refresh_week(db, user_id, monday)
+    refresh_sleep_state(db, user_id)
+
+
+def rebuild(db):
+    """Recompute every rollup from wearabled (backfill for existing databases)"""
+    db.execute('DELETE FROM wearable_daily')
+    db.execute('DELETE FROM wearable_weekly')
+    db.execute(f'''
+        INSERT INTO wearable_daily ({DAILY_COLUMNS})
+        SELECT user_id, DATE(recorded_at), {DAILY_AGGREGATES} FROM wearabled
+        WHERE user_id IS NOT NULL AND DATE(recorded_at) IS NOT NULL
+        GROUP BY user_id, DATE(recorded_at)
+    ''')
+    weeks = {(row[0], week_start(row[1]))
+             for row in db.execute('SELECT user_id, day FROM wearable_daily').fetchall()}
+    for user_id, monday in sorted(weeks):
+        refresh_week(db, user_id, monday)
+
+
+def rebuild_sleep_state(db):
+    """Recompute every user's sleep state from wearable_daily"""
+    db.execute('DELETE FROM sleep_state')
+    for (user_id,) in db.execute('SELECT DISTINCT user_id FROM wearable_daily WHERE sleep_hours > 0').fetchall():
+        refresh_sleep_state(db, user_id)
+
+
+def refresh_sleep_state(db, user_id):
+    """
+    Recompute a user's rolling sleep window (sum/count over the last 7 days
+    with sleep, latest night, score and label) from at most 7 daily rows
+    """
+    window = recent_sleep(db, user_id, SLEEP_WINDOW_DAYS)
+    db.execute('DELETE FROM sleep_state WHERE user_id = ?', (user_id,))
+    if not window:
+        return
+    sleep_sum = sum(d['sleep_hours'] for d in window)
+    latest = window[-1]
+    scored = _adjuster.score_sleep(sleep_sum / len(window), latest['sleep_hours'])
+    db.execute('INSERT INTO sleep_state (user_id, window_start, days, sleep_sum, latest_day, latest_sleep, score, quality) '
+               'VALUES (?,?,?,?,?,?,?,?)',
+               (user_id, window[0]['day'], len(window), sleep_sum, latest['day'], latest['sleep_hours'],
+                scored['score'], scored['quality']))
+
+
+# --- Reads -------------------------------------------------------------------
+
+def daily_steps(db, user_id, limit=7):
+    """Most recent days first, shaped like the old raw rows (recorded_at, steps)"""
+    rows = db.execute('SELECT day AS recorded_at, steps FROM wearable_daily WHERE user_id = ? '
+                      'ORDER BY day DESC LIMIT ?', (user_id, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def recent_sleep(db, user_id, days=7):
+    """Nightly sleep for the last `days` days that have any, oldest first (input to analyze_sleep_quality)"""
+    rows = db.execute('SELECT day, sleep_hours FROM wearable_daily WHERE user_id = ? AND sleep_hours > 0 '
+                      'ORDER BY day DESC LIMIT ?', (user_id, days)).fetchall()
+    return [{'day': r[0], 'sleep_hours': r[1]} for r in reversed(rows)]
+
+
+def sleep_quality(db, user_id):
+    """
+    The persisted sleep state, shaped like DynamicAdjuster.analyze_sleep_quality()
+    Returns:
+        dict with quality, score, avg_sleep, latest_sleep and recommendation, or None without sleep data
+    """
+    row = db.execute('SELECT days, sleep_sum, latest_sleep, score, quality FROM sleep_state WHERE user_id = ?',
+                     (user_id,)).fetchone()
+    return _sleep_quality_dict(row) if row is not None else None
+
+
+def sleep_quality_many(db, user_ids):
+    """sleep_quality() for a batch of users in one query; users without sleep data are left out"""
+    if not user_ids:
+        return {}
+    rows = db.execute(f'SELECT user_id, days, sleep_sum, latest_sleep, score, quality FROM sleep_state '
+                      f'WHERE user_id IN ({",".join("?" * len(user_ids))})', tuple(user_ids)).fetchall()
+    return {row['user_id']: _sleep_quality_dict(row) for row in rows}
+
+
+def _sleep_quality_dict(row):
+    return {
+        'quality': row['quality'],
+        'score': row['score'],
+        'avg_sleep': round(row['sleep_sum'] / row['days'], 1),
+        'latest_sleep': round(row['latest_sleep'], 1),
+        'recommendation': _adjuster.sleep_recommendation(row['score'])
+    }
+
+
+def weekly_activity(db, user_id, today=None):
+    """
+    Summary of the current week's wearable data, for DynamicAdjuster.adjust_diet_plan
+    Older weeks are ignored, so a user who stopped syncing gets no activity-based adjustment.
+    Args:
+        today: Day whose week to summarize (default today)
+    Returns:
+        dict with avg_steps, avg_heart_rate, min/max heart rate, sleep and calories, or None
+    """
+    monday = week_start(today or datetime.now().date())
+    row = db.execute(f'SELECT {WEEKLY_COLUMNS} FROM wearable_weekly WHERE user_id = ? AND week_start = ?',
+                     (user_id, monday)).fetchone()
+    if row is None or not row['days']:
+        return None
+    return {
+        'week_start': row['week_start'],
+        'days': row['days'],
+        'avg_steps': int(row['steps'] / row['days']),
+        'avg_heart_rate': round(row['hr_total'] / row['hr_samples'], 1) if row['hr_samples'] else None,
+        'min_heart_rate': row['hr_min'],
+        'max_heart_rate': row['hr_max'],
+        'avg_sleep': round(row['sleep_hours'] / row['days'], 1),
+        'calories_burned': row['calories_burned'],
+    }
@@ -0,0 +1,72 @@
+"""
+Startup Benchmark and Import-Time Budget Check
+Imports app.py in fresh interpreters (like a gunicorn worker boot) and fails
+if the import is over budget or pulls in the ML stack eagerly. Runs against a
+scratch database with AUTO_MIGRATE off, so the committed data.db is untouched
+and the timings measure the import alone.
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--budget-ms 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that must only load when a route actually uses ML
+LAZY_MODULES = ('numpy', 'sklearn', 'scipy', 'pandas')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - start) * 1000
+eager = [m for m in %r if m in sys.modules]
+print(json.dumps({"ms": elapsed, "eager": eager}))
+''' % (LAZY_MODULES,)
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 500)))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ, AUTO_MIGRATE='false', DATABASE_PATH=os.path.join(tmp, 'data.db'),
+               MODEL_DIR=os.path.join(tmp, 'models'))
+    try:
+        results = [run_once(env) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    times = sorted(r['ms'] for r in results)
+    median = statistics.median(times)
+    print(f"import app: median {median:.1f} ms, min {times[0]:.1f} ms, max {times[-1]:.1f} ms "
+          f"over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    eager = sorted({m for r in results for m in r['eager']})
+    if eager:
+        print(f"FAIL: imported eagerly at startup: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: startup import over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Password Hashing Pool Check
+Verifies that PasswordHasher keeps its bound when a hash times out: the caller
+gets HashingBusy, but the job keeps its slot until the worker process really
+finishes, so the next hash is rejected instead of piling more work onto the pool.
+
+Usage:
+    python scripts/check_hashing_pool.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hashing import HashingBusy, PasswordHasher  # noqa: E402
+
+SLOW_JOB_SECONDS = 1.5
+
+
+def wait_idle(hasher, seconds=10.0):
+    deadline = time.monotonic() + seconds
+    while hasher.stats()['in_flight'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return hasher.stats()['in_flight'] == 0
+
+
+def main():
+    failures = []
+    # One worker and no queue: exactly one job may be outstanding at a time
+    hasher = PasswordHasher(max_workers=1, max_pending=0, timeout=0.3)
+    try:
+        pwhash = hasher.hash('correct horse')
+        if not hasher.verify(pwhash, 'correct horse') or hasher.verify(pwhash, 'wrong'):
+            failures.append('hash/verify round trip through the pool failed')
+
+        try:
+            hasher._run('hashed', time.sleep, SLOW_JOB_SECONDS)
+            failures.append('slow job did not time out')
+        except HashingBusy:
+            pass
+        stats = hasher.stats()
+        if stats['timeouts'] != 1 or stats['in_flight'] != 1:
+            failures.append(f'after the timeout expected timeouts=1, in_flight=1, got {stats}')
+
+        # The timed-out job is still running in the worker, so its slot is still taken
+        try:
+            hasher._run('hashed', time.sleep, 0)
+            failures.append('a second job was accepted while the timed-out one was still running')
+        except HashingBusy:
+            if hasher.stats()['rejected'] != 1:
+                failures.append(f"expected the second job to be rejected, got {hasher.stats()}")
+
+        if not wait_idle(hasher):
+            failures.append(f'timed-out job never released its slot: {hasher.stats()}')
+        try:
+            hasher._run('hashed', time.sleep, 0)
+        except HashingBusy:
+            failures.append('slot was not freed after the timed-out job finished')
+    finally:
+        if hasher._executor is not None:
+            hasher._executor.shutdown(wait=True)
+
+    print(f"password hasher stats: {hasher.stats()}")
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print('OK')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
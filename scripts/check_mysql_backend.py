@@ -0,0 +1,295 @@
+"""
+MySQL Backend Check
+Exercises the USE_MYSQL=true code path without a MySQL server: MySQLPool and
+MySQLConnection run on top of an in-process stand-in for pymysql connections
+that executes on a scratch SQLite database. The stand-in formats each query
+the way pymysql does (query % params), so bad %s/%% translation fails here,
+and it rejects SQLite-only syntax that translate_query should have rewritten.
+Checks translate_query, the pool's timeout, ping, idle reaping and
+rollback-on-release behaviour, then drives the app's routes through the pool.
+
+Usage:
+    python scripts/check_mysql_backend.py [--verbose]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import MySQLPool, PoolTimeout, create_pool, translate_query  # noqa: E402
+
+# Spellings MySQL rejects (or reads differently) that must not reach the server
+SQLITE_ONLY = re.compile(r"""\b(?:date|datetime)\s*\(\s*['"]now['"]|\b(?:strftime|julianday)\s*\(|"""
+                         r'\bINSERT\s+OR\b|\bON\s+CONFLICT\b|\bPRAGMA\b|\bsqlite_master\b|\|\||'
+                         r'(?<![`\w.])rank(?![`\w])', re.IGNORECASE)
+
+# The MySQL spellings translate_query produces, mapped back so SQLite can run them
+_BACK_TO_SQLITE = (
+    (re.compile(r'\bCURDATE\(\)', re.IGNORECASE), "date('now')"),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+)
+
+TRANSLATIONS = (
+    ('SELECT * FROM users WHERE id = ?', 'SELECT * FROM users WHERE id = %s'),
+    ("SELECT * FROM t WHERE a = 'what?' AND b = ?", "SELECT * FROM t WHERE a = 'what?' AND b = %s"),
+    ("SELECT * FROM t WHERE name LIKE '%run%' AND id = ?", "SELECT * FROM t WHERE name LIKE '%%run%%' AND id = %s"),
+    ('SELECT a % 2 FROM t WHERE `c?` = ?', 'SELECT a %% 2 FROM t WHERE `c?` = %s'),
+    ("SELECT 1 FROM t WHERE d >= date('now') AND e < date(\"now\")",
+     'SELECT 1 FROM t WHERE d >= CURDATE() AND e < CURDATE()'),
+    ('insert or ignore into t (a) values (?)', 'INSERT IGNORE into t (a) values (%s)'),
+)
+
+
+class StandInError(Exception):
+    """A query the stand-in would not send to a MySQL server"""
+
+
+class StandInCursor:
+    """pymysql cursor look-alike over a sqlite3 cursor"""
+
+    def __init__(self, server, sqlite_conn):
+        self._server = server
+        self._cursor = sqlite_conn.cursor()
+
+    def _to_sqlite(self, query, params):
+        bad = SQLITE_ONLY.search(query)
+        if bad:
+            self._server.reject(f'SQLite-only syntax {bad.group(0)!r} in: {query}')
+        # pymysql interpolates with query % args; mismatched %s or a stray % fails the same way here
+        try:
+            sql = query % tuple('?' for _ in params)
+        except (TypeError, ValueError) as e:
+            self._server.reject(f'{e} formatting {len(params)} params into: {query}')
+        for pattern, replacement in _BACK_TO_SQLITE:
+            sql = pattern.sub(replacement, sql)
+        self._server.statements.append(query)
+        return sql
+
+    def execute(self, query, args=()):
+        self._cursor.execute(self._to_sqlite(query, args), args)
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        args = list(args)
+        if args:
+            self._cursor.executemany(self._to_sqlite(query, args[0]), args)
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    """pymysql connection look-alike (autocommit off) backed by its own SQLite connection"""
+
+    def __init__(self, server):
+        self._server = server
+        self._conn = sqlite3.connect(server.path, check_same_thread=False)
+        self.open = True
+
+    def cursor(self, cursor_class=None):
+        return StandInCursor(self._server, self._conn)
+
+    def commit(self):
+        self._conn.commit()
+        self._server.count('commits')
+
+    def rollback(self):
+        self._conn.rollback()
+        self._server.count('rollbacks')
+
+    def ping(self, reconnect=True):
+        self._server.count('pings')
+        if self._server.gone or not self.open:
+            raise StandInError('MySQL server has gone away')
+
+    def close(self):
+        self.open = False
+        self._conn.close()
+        self._server.count('closed')
+
+
+class StandInServer:
+    """Connection factory for MySQLPool plus counters for the checks"""
+
+    def __init__(self, path):
+        self.path = path
+        self.gone = False
+        self.statements = []
+        self.rejected = []  # recorded too, since some app code catches and logs query errors
+        self.counters = {'connects': 0, 'commits': 0, 'rollbacks': 0, 'pings': 0, 'closed': 0}
+
+    def reject(self, message):
+        self.rejected.append(message)
+        raise StandInError(message)
+
+    def count(self, key):
+        self.counters[key] += 1
+
+    def __call__(self):
+        self.count('connects')
+        return StandInConnection(self)
+
+
+class Checks:
+    def __init__(self, verbose):
+        self.verbose = verbose
+        self.failures = 0
+
+    def expect(self, ok, label):
+        if not ok:
+            self.failures += 1
+            print(f'FAIL: {label}')
+        elif self.verbose:
+            print(f'ok: {label}')
+
+
+def check_translation(checks):
+    for sql, expected in TRANSLATIONS:
+        got = translate_query(sql)
+        checks.expect(got == expected, f'translate_query({sql!r}) -> {got!r}, expected {expected!r}')
+
+
+def check_pool(checks, path):
+    server = StandInServer(path)
+    pool = MySQLPool(server, max_size=2, acquire_timeout=0.2, ping_after=30.0, idle_timeout=300.0)
+
+    # Bounded: a third caller times out instead of opening another connection
+    first, second = pool.acquire(), pool.acquire()
+    try:
+        pool.acquire()
+        checks.expect(False, 'third acquire on a max_size=2 pool raises PoolTimeout')
+    except PoolTimeout:
+        checks.expect(pool.stats()['timeouts'] == 1, 'pool timeout is counted')
+    pool.release(second)
+
+    # Rows come back with index and column-name access, uncommitted work is rolled back on release
+    first.execute("INSERT INTO users (name,email,password_hash) VALUES (?,?,'x')", ('Pool User', 'pool@example.com'))
+    row = first.execute('SELECT id, name FROM users WHERE email = ?', ('pool@example.com',)).fetchone()
+    checks.expect(row is not None and row['name'] == row[1] == 'Pool User', 'rows support index and name access')
+    pool.release(first)
+    checks.expect(pool.stats()['rollbacks'] == 1 and server.counters['rollbacks'] == 1,
+                  'open transaction is rolled back on release')
+    with pool.connection() as conn:
+        gone = conn.execute('SELECT COUNT(*) FROM users WHERE email = ?', ('pool@example.com',)).fetchone()[0]
+    checks.expect(gone == 0, 'rolled-back insert is not visible to the next user')
+    checks.expect(pool.stats()['created'] == 2 and pool.stats()['reused'] >= 1, 'released connections are reused')
+
+    # A connection idle past ping_after is pinged; a dead one is replaced
+    pool.ping_after = 0.0
+    for conn in pool._idle:
+        conn.last_used -= 1
+    server.gone = True
+    with pool.connection() as conn:
+        pass
+    server.gone = False
+    stats = pool.stats()
+    checks.expect(stats['pings_failed'] >= 1 and server.counters['connects'] == 3,
+                  'connection failing its ping is closed and replaced')
+
+    # Connections idle past idle_timeout are closed instead of reused
+    pool.idle_timeout = 0.5
+    for conn in pool._idle:
+        conn.last_used = time.monotonic() - 1
+    idle = len(pool._idle)
+    with pool.connection() as conn:
+        pass
+    checks.expect(pool.stats()['evicted_idle'] == idle, 'idle connections past idle_timeout are evicted')
+    pool.close_all()
+    checks.expect(pool.stats()['idle'] == 0 and pool.stats()['in_use'] == 0, 'close_all leaves nothing open')
+
+
+def exercise_routes(app_module, checks):
+    app = app_module.app
+    app.config['TESTING'] = True
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['name'] = 'Plan User'
+    requests = [('get', path, {}) for path in ('/dashboard', '/recommendations', '/schedule', '/community',
+                                               '/challenges', '/edit_profile')]
+    requests += [
+        ('post', '/add_workout', {'data': {'date': '2025-11-09', 'workout_type': 'Yoga', 'duration': '30',
+                                           'calories': '150'}}),
+        ('post', '/add_diet', {'data': {'date': '2025-11-09', 'meal_type': 'Dinner', 'calories': '700',
+                                        'protein': '30', 'carbs': '80', 'fats': '20'}}),
+        ('post', '/wearable', {'data': {'recorded_at': '2025-11-09 07:00:00', 'steps': '9000', 'heart_rate': '65',
+                                        'sleep_hours': '4.5', 'calories_burned': '300'}}),
+        ('post', '/api/wearable/batch', {'json': [{'recorded_at': '2025-11-10 07:00:00', 'steps': 5000}]}),
+        ('post', '/schedule/complete/1', {}),
+        ('post', '/challenges/join/1', {}),
+        ('post', '/schedule/generate', {}),
+        ('post', '/edit_profile', {'data': {'weight_kg': '59.5'}}),
+        ('get', '/export?format=csv&table=workout', {}),
+        ('get', '/dashboard', {}),
+    ]
+    for method, path, kwargs in requests:
+        try:
+            response = getattr(client, method)(path, **kwargs)
+            response.get_data()  # /export streams its body from its own pooled connection
+            checks.expect(response.status_code < 500, f'{method.upper()} {path} -> {response.status_code}')
+        except Exception as e:
+            checks.expect(False, f'{method.upper()} {path} raised {type(e).__name__}: {e}')
+
+
+def main():
+    checks = Checks('--verbose' in sys.argv)
+    tmp = tempfile.mkdtemp(prefix='mysql-backend-')
+    try:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'data.db')
+        os.environ['MODEL_DIR'] = os.path.join(tmp, 'models')
+        os.environ['TRAINING_WORKERS'] = '0'
+        import app as app_module  # builds the schema through the SQLite migrations
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from check_query_plans import seed
+        with app_module.db_pool.connection() as conn:
+            seed(conn)
+        app_module.db_pool.close_all()
+
+        check_translation(checks)
+        check_pool(checks, os.environ['DATABASE_PATH'])
+
+        # Every app query from here on goes through MySQLPool, MySQLConnection and translate_query
+        server = StandInServer(os.environ['DATABASE_PATH'])
+        app_module.db_pool = create_pool({'dialect': 'mysql', 'pool_size': 4, 'idle_timeout': 300.0}, connect=server)
+        exercise_routes(app_module, checks)
+        for message in dict.fromkeys(server.rejected):
+            checks.expect(False, message)
+        distinct = {' '.join(s.split()) for s in server.statements}
+        checks.expect(app_module.db_pool.stats()['in_use'] == 0, 'every request returned its connection')
+        print(f"{len(distinct)} distinct translated queries ran through the MySQL pool "
+              f"({app_module.db_pool.stats()['created']} connections), {checks.failures} failures")
+        return 1 if checks.failures else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
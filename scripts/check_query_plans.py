@@ -0,0 +1,143 @@
+"""
+Query Plan Check
+Runs the app's routes against a scratch SQLite database (built through the
+same migration path used for existing databases), records every query they
+execute and fails if EXPLAIN QUERY PLAN shows a full table scan, or if a page
+errors for a freshly signed-up user whose profile fields are still NULL.
+
+Usage:
+    python scripts/check_query_plans.py [--verbose]
+"""
+import os
+import re
+import sys
+import shutil
+import sqlite3
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statements that are not route queries
+IGNORED = re.compile(r'^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|CREATE|DROP|ALTER|SAVEPOINT|RELEASE)\b|sqlite_master',
+                     re.IGNORECASE)
+TABLE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\w+)(?:\s+AS\s+\w+)?$')
+
+
+def build_database(path):
+    """Create the base tables without indexes, like a database from before they existed"""
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'sql', 'sqlite_schema.sql')) as f:
+        conn.executescript(f.read())
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        conn.execute(f'DROP INDEX {name}')
+    conn.commit()
+    conn.close()
+
+
+def seed(conn):
+    conn.execute("INSERT INTO users (id,name,email,password_hash,age,gender,height_cm,weight_kg,activity_level) "
+                 "VALUES (1,'Plan User','plan@example.com','x',30,'Female',165,60,'Active')")
+    # Fresh signup: no age, weight, height or activity level yet
+    conn.execute("INSERT INTO users (id,name,email,password_hash) VALUES (2,'New User','new@example.com','x')")
+    for day in range(1, 8):
+        date = f'2025-11-{day:02d}'
+        conn.execute("INSERT INTO workout (user_id,date,workout_type,duration_min,calories_burned) VALUES (1,?,'Running',30,300)", (date,))
+        conn.execute("INSERT INTO diet (user_id,date,meal_type,calories) VALUES (1,?,'Lunch',600)", (date,))
+        conn.execute("INSERT INTO wearabled (user_id,recorded_at,steps,heart_rate,sleep_hours,calories_burned) "
+                     "VALUES (1,?,8000,70,5.0,400)", (date + ' 07:00:00',))
+        conn.execute("INSERT INTO workout_schedule (user_id,scheduled_date,workout_type,duration_min,status) "
+                     "VALUES (1,date('now', ?),'Cycling',40,'pending')", (f'{day - 3} days',))
+    conn.execute("INSERT INTO community (user_id,points) VALUES (1,50)")
+    conn.execute("INSERT INTO challenges (name,start_date,end_date,target_metric,target_value,points_reward) "
+                 "VALUES ('Steps',date('now','-1 day'),date('now','+30 days'),'steps',70000,100)")
+    conn.commit()
+
+
+def exercise_routes(app_module, statements):
+    """Returns a list of pages that failed for the fresh user"""
+    app = app_module.app
+    app.config['TESTING'] = True
+
+    # Record every statement executed on pooled connections
+    acquire = app_module.db_pool.acquire
+    def traced_acquire():
+        conn = acquire()
+        conn.set_trace_callback(statements.append)
+        return conn
+    app_module.db_pool.acquire = traced_acquire
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['name'] = 'Plan User'
+    for path in ('/dashboard', '/recommendations', '/schedule', '/community', '/challenges', '/edit_profile'):
+        client.get(path)
+    client.post('/add_workout', data={'date': '2025-11-09', 'workout_type': 'Yoga', 'duration': '30', 'calories': '150'})
+    client.post('/add_diet', data={'date': '2025-11-09', 'meal_type': 'Dinner', 'calories': '700',
+                                   'protein': '30', 'carbs': '80', 'fats': '20'})
+    client.post('/wearable', data={'recorded_at': '2025-11-09 07:00:00', 'steps': '9000', 'heart_rate': '65',
+                                   'sleep_hours': '4.5', 'calories_burned': '300'})
+    client.post('/schedule/complete/1')
+    client.post('/challenges/join/1')
+    client.post('/schedule/generate')
+    client.post('/edit_profile', data={'weight_kg': '59.5'})
+    client.post('/login', data={'email': 'plan@example.com', 'password': 'wrong'})
+
+    # Sleep data alone drives diet and schedule adjustments against the NULL profile
+    errors = []
+    fresh = app.test_client()
+    with fresh.session_transaction() as sess:
+        sess['user_id'] = 2
+        sess['name'] = 'New User'
+    fresh.post('/wearable', data={'recorded_at': '2025-11-09 07:00:00', 'steps': '12000', 'sleep_hours': '4.0'})
+    for path in ('/dashboard', '/recommendations', '/schedule'):
+        try:
+            status = fresh.get(path).status_code
+        except Exception as e:
+            status = f'{type(e).__name__}: {e}'
+        if status != 200:
+            errors.append(f'GET {path} as a new user -> {status}')
+    return errors
+
+
+def main():
+    verbose = '--verbose' in sys.argv
+    tmp = tempfile.mkdtemp(prefix='query-plans-')
+    try:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'data.db')
+        os.environ['MODEL_DIR'] = os.path.join(tmp, 'models')
+        os.environ['TRAINING_WORKERS'] = '0'
+        build_database(os.environ['DATABASE_PATH'])
+        sys.path.insert(0, ROOT)
+        import app as app_module  # runs the migrations, the path existing databases take
+        with app_module.db_pool.connection() as conn:
+            seed(conn)
+
+        statements = []
+        errors = exercise_routes(app_module, statements)
+        for error in errors:
+            print(f'ROUTE ERROR: {error}')
+
+        failures = 0
+        checked = set()
+        with app_module.db_pool.connection() as conn:
+            for sql in statements:
+                key = ' '.join(sql.split())
+                if key in checked or IGNORED.search(key):
+                    continue
+                checked.add(key)
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()]
+                scans = [detail for detail in plan if TABLE_SCAN.match(detail)]
+                if scans:
+                    failures += 1
+                    print(f"FULL SCAN ({', '.join(scans)}): {key}")
+                elif verbose:
+                    print(f"ok: {key}\n    " + '\n    '.join(plan))
+        print(f"{len(checked)} distinct queries checked, {failures} with full table scans")
+        return 1 if failures or errors else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Join Challenge Stress Test
+Fires many parallel POST /challenges/join requests (several per user, released
+at once like double-clicks) against a scratch SQLite database and fails unless
+every user ends up with exactly one user_challenges row and the challenge's
+participant_count matches.
+
+Usage:
+    python scripts/stress_join_challenge.py [--users 50] [--clicks 8] [--threads 32]
+"""
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(conn, users):
+    conn.executemany("INSERT INTO users (id,name,email,password_hash) VALUES (?,?,?,'x')",
+                     [(i, f'User {i}', f'user{i}@example.com') for i in range(1, users + 1)])
+    conn.execute("INSERT INTO challenges (id,name,start_date,end_date,target_metric,target_value,points_reward) "
+                 "VALUES (1,'Stress',date('now','-1 day'),date('now','+30 days'),'workouts',1000,10)")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--clicks', type=int, default=8, help='Parallel joins per user')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='join-stress-')
+    try:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'data.db')
+        os.environ['MODEL_DIR'] = os.path.join(tmp, 'models')
+        os.environ['TRAINING_WORKERS'] = '0'
+        sys.path.insert(0, ROOT)
+        import app as app_module  # creates the database through the migrations
+        app = app_module.app
+        app.config['TESTING'] = True
+        with app_module.db_pool.connection() as conn:
+            seed(conn, args.users)
+
+        # A user's clicks sit next to each other, so thread k's i-th request races the
+        # other threads' i-th requests for the same few users
+        clicks = [u for u in range(1, args.users + 1) for _ in range(args.clicks)]
+        total = len(clicks)
+        threads = min(args.threads, total)
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def worker(offset):
+            clients = {}
+            barrier.wait()
+            for user_id in clicks[offset::threads]:
+                client = clients.get(user_id)
+                if client is None:
+                    client = clients[user_id] = app.test_client()
+                    with client.session_transaction() as sess:
+                        sess['user_id'] = user_id
+                response = client.post('/challenges/join/1')
+                if response.status_code != 302:
+                    errors.append((user_id, response.status_code))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        seconds = time.perf_counter() - started
+
+        with app_module.db_pool.connection() as conn:
+            duplicates = [tuple(r) for r in conn.execute('SELECT user_id, COUNT(*) FROM user_challenges '
+                                                         'WHERE challenge_id = 1 GROUP BY user_id '
+                                                         'HAVING COUNT(*) != 1').fetchall()]
+            joined = conn.execute('SELECT COUNT(DISTINCT user_id) FROM user_challenges WHERE challenge_id = 1').fetchone()[0]
+            counter = conn.execute('SELECT participant_count FROM challenges WHERE id = 1').fetchone()[0]
+
+        print(f'{total} joins from {args.users} users in {seconds:.2f}s ({int(total / seconds)} joins/s)')
+        failed = False
+        if errors:
+            print(f'FAIL: {len(errors)} requests errored, e.g. {errors[:3]}')
+            failed = True
+        if duplicates or joined != args.users:
+            print(f'FAIL: expected one row for each of {args.users} users, got {joined} users, duplicates {duplicates[:3]}')
+            failed = True
+        if counter != args.users:
+            print(f'FAIL: participant_count is {counter}, expected {args.users}')
+            failed = True
+        if not failed:
+            print('OK')
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+-- MySQL schema used by app.py when USE_MYSQL=true (same tables and columns as sqlite_schema.sql)
+SET FOREIGN_KEY_CHECKS = 0;
+DROP TABLE IF EXISTS user_challenges;
+DROP TABLE IF EXISTS challenges;
+DROP TABLE IF EXISTS workout_schedule;
+DROP TABLE IF EXISTS points_events;
+DROP TABLE IF EXISTS points_keys;
+DROP TABLE IF EXISTS community;
+DROP TABLE IF EXISTS progress;
+DROP TABLE IF EXISTS wearable_weekly;
+DROP TABLE IF EXISTS wearable_daily;
+DROP TABLE IF EXISTS sleep_state;
+DROP TABLE IF EXISTS wearabled;
+DROP TABLE IF EXISTS diet;
+DROP TABLE IF EXISTS workout;
+DROP TABLE IF EXISTS users;
+SET FOREIGN_KEY_CHECKS = 1;
+
+CREATE TABLE users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100),
+    email VARCHAR(150) UNIQUE,
+    password_hash VARCHAR(255),
+    age INT,
+    gender VARCHAR(20),
+    height_cm INT,
+    weight_kg DOUBLE,
+    activity_level VARCHAR(50),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    profile_version INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+CREATE TABLE workout (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    date DATE,
+    workout_type VARCHAR(100),
+    duration_min INT,
+    calories_burned INT,
+    notes TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE diet (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    date DATE,
+    meal_type VARCHAR(50),
+    calories INT,
+    protein_g DOUBLE,
+    carbs_g DOUBLE,
+    fats_g DOUBLE,
+    notes TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE wearabled (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    recorded_at DATETIME,
+    steps INT,
+    heart_rate INT,
+    sleep_hours DOUBLE,
+    calories_burned INT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE progress (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    date DATE,
+    weight_kg DOUBLE,
+    bmi DOUBLE,
+    notes TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE community (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    points INT DEFAULT 0,
+    badges VARCHAR(255),
+    `rank` INT DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE workout_schedule (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    scheduled_date DATE,
+    workout_type VARCHAR(100),
+    duration_min INT,
+    status VARCHAR(20) DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    adjusted_on DATE,
+    adjustment_note VARCHAR(255),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE challenges (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255),
+    description TEXT,
+    start_date DATE,
+    end_date DATE,
+    target_metric VARCHAR(50),
+    target_value DOUBLE,
+    points_reward INT,
+    participant_count INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+CREATE TABLE user_challenges (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    challenge_id INT,
+    progress_value DOUBLE DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'active',
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (challenge_id) REFERENCES challenges(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Daily/weekly wearable rollups, refreshed from wearabled by rollups.py on every write
+CREATE TABLE wearable_daily (
+    user_id INT NOT NULL,
+    day DATE NOT NULL,
+    samples INT DEFAULT 0,
+    steps BIGINT DEFAULT 0,
+    hr_samples INT DEFAULT 0,
+    hr_total BIGINT DEFAULT 0,
+    hr_min INT,
+    hr_max INT,
+    sleep_hours DOUBLE DEFAULT 0,
+    calories_burned BIGINT DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE wearable_weekly (
+    user_id INT NOT NULL,
+    week_start DATE NOT NULL,
+    days INT DEFAULT 0,
+    samples INT DEFAULT 0,
+    steps BIGINT DEFAULT 0,
+    hr_samples INT DEFAULT 0,
+    hr_total BIGINT DEFAULT 0,
+    hr_min INT,
+    hr_max INT,
+    sleep_hours DOUBLE DEFAULT 0,
+    calories_burned BIGINT DEFAULT 0,
+    PRIMARY KEY (user_id, week_start),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Rolling sleep-quality window per user (last 7 days with sleep), kept current by rollups.py
+CREATE TABLE sleep_state (
+    user_id INT PRIMARY KEY,
+    window_start DATE,
+    days INT DEFAULT 0,
+    sleep_sum DOUBLE DEFAULT 0,
+    latest_day DATE,
+    latest_sleep DOUBLE,
+    score DOUBLE,
+    quality VARCHAR(20),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Append-only ledger of point awards; community.points is the running total of these rows
+CREATE TABLE points_events (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    delta INT NOT NULL,
+    reason VARCHAR(50) NOT NULL,
+    source_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- One row per keyed award (e.g. schedule 12 or challenge entry 7); kept when the ledger is compacted
+CREATE TABLE points_keys (
+    user_id INT NOT NULL,
+    reason VARCHAR(50) NOT NULL,
+    source_id INT NOT NULL,
+    PRIMARY KEY (user_id, reason, source_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Indexes for the per-user queries every route runs (filter by user, sort by date)
+CREATE INDEX idx_workout_user_date ON workout (user_id, date);
+CREATE INDEX idx_diet_user_date ON diet (user_id, date);
+CREATE INDEX idx_progress_user_date ON progress (user_id, date);
+CREATE UNIQUE INDEX uq_wearabled_user_recorded ON wearabled (user_id, recorded_at);
+CREATE UNIQUE INDEX uq_community_user ON community (user_id);
+CREATE INDEX idx_community_points ON community (points);
+CREATE INDEX idx_schedule_user_status_date ON workout_schedule (user_id, status, scheduled_date);
+CREATE INDEX idx_schedule_user_date ON workout_schedule (user_id, scheduled_date);
+CREATE INDEX idx_challenges_end_date ON challenges (end_date);
+CREATE INDEX idx_challenges_start_end ON challenges (start_date, end_date);
+CREATE UNIQUE INDEX uq_user_challenges_user_challenge ON user_challenges (user_id, challenge_id);
+CREATE INDEX idx_user_challenges_challenge ON user_challenges (challenge_id);
+CREATE INDEX idx_points_events_user_created ON points_events (user_id, created_at);
@@ -6,7 +6,12 @@ DROP TABLE IF EXISTS users;
 DROP TABLE IF EXISTS workout;
 DROP TABLE IF EXISTS diet;
 DROP TABLE IF EXISTS wearabled;
+DROP TABLE IF EXISTS wearable_daily;
+DROP TABLE IF EXISTS sleep_state;
+DROP TABLE IF EXISTS wearable_weekly;
 DROP TABLE IF EXISTS progress;
+DROP TABLE IF EXISTS points_events;
+DROP TABLE IF EXISTS points_keys;
 DROP TABLE IF EXISTS community;
 
 CREATE TABLE users (
@@ -19,7 +24,8 @@ CREATE TABLE users (
     height_cm INTEGER,
     weight_kg REAL,
     activity_level TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    profile_version INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE workout (
@@ -84,6 +90,8 @@ CREATE TABLE workout_schedule (
     duration_min INTEGER,
     status TEXT DEFAULT 'pending',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    adjusted_on DATE,
+    adjustment_note TEXT,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -96,6 +104,7 @@ CREATE TABLE challenges (
     target_metric TEXT,
     target_value REAL,
     points_reward INTEGER,
+    participant_count INTEGER DEFAULT 0,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -109,3 +118,83 @@ CREATE TABLE user_challenges (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (challenge_id) REFERENCES challenges(id) ON DELETE CASCADE
 );
+
+-- Daily/weekly wearable rollups, refreshed from wearabled by rollups.py on every write
+CREATE TABLE wearable_daily (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    samples INTEGER DEFAULT 0,
+    steps INTEGER DEFAULT 0,
+    hr_samples INTEGER DEFAULT 0,
+    hr_total INTEGER DEFAULT 0,
+    hr_min INTEGER,
+    hr_max INTEGER,
+    sleep_hours REAL DEFAULT 0,
+    calories_burned INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE wearable_weekly (
+    user_id INTEGER NOT NULL,
+    week_start DATE NOT NULL,
+    days INTEGER DEFAULT 0,
+    samples INTEGER DEFAULT 0,
+    steps INTEGER DEFAULT 0,
+    hr_samples INTEGER DEFAULT 0,
+    hr_total INTEGER DEFAULT 0,
+    hr_min INTEGER,
+    hr_max INTEGER,
+    sleep_hours REAL DEFAULT 0,
+    calories_burned INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, week_start),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Rolling sleep-quality window per user (last 7 days with sleep), kept current by rollups.py
+CREATE TABLE sleep_state (
+    user_id INTEGER PRIMARY KEY,
+    window_start DATE,
+    days INTEGER DEFAULT 0,
+    sleep_sum REAL DEFAULT 0,
+    latest_day DATE,
+    latest_sleep REAL,
+    score REAL,
+    quality TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Append-only ledger of point awards; community.points is the running total of these rows
+CREATE TABLE points_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    delta INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    source_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- One row per keyed award (e.g. schedule 12 or challenge entry 7); kept when the ledger is compacted
+CREATE TABLE points_keys (
+    user_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, reason, source_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Indexes for the per-user queries every route runs (filter by user, sort by date)
+CREATE INDEX idx_workout_user_date ON workout(user_id, date);
+CREATE INDEX idx_diet_user_date ON diet(user_id, date);
+CREATE INDEX idx_progress_user_date ON progress(user_id, date);
+CREATE UNIQUE INDEX uq_wearabled_user_recorded ON wearabled(user_id, recorded_at);
+CREATE UNIQUE INDEX uq_community_user ON community(user_id);
+CREATE INDEX idx_community_points ON community(points);
+CREATE INDEX idx_schedule_user_status_date ON workout_schedule(user_id, status, scheduled_date);
+CREATE INDEX idx_schedule_user_date ON workout_schedule(user_id, scheduled_date);
+CREATE INDEX idx_challenges_end_date ON challenges(end_date);
+CREATE INDEX idx_challenges_start_end ON challenges(start_date, end_date);
+CREATE UNIQUE INDEX uq_user_challenges_user_challenge ON user_challenges(user_id, challenge_id);
+CREATE INDEX idx_user_challenges_challenge ON user_challenges(challenge_id);
+CREATE INDEX idx_points_events_user_created ON points_events(user_id, created_at);
@@ -0,0 +1,146 @@
+"""
+Background Training Queue
+Fits recommender models in a process pool so requests never wait on scikit-learn.
+Write paths enqueue a "user data changed" event; finished models are published
+to the ModelStore where /recommendations picks them up.
+"""
+import queue
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from db import connect
+from ml_recommender import FitnessRecommender
+from model_store import data_fingerprint
+from records import WorkoutRecord, DietRecord, UserProfile
+
+
+def load_training_data(db, user_id):
+    """
+    Load everything the recommender is trained on for one user
+    Returns:
+        (user_profile, workout_list, diet_list) or (None, [], []) if the user is gone
+    """
+    users = UserProfile.from_rows(db.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchall())
+    if not users:
+        return None, [], []
+    workouts = db.execute('SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC LIMIT 50', (user_id,)).fetchall()
+    diets = db.execute('SELECT * FROM diet WHERE user_id = ? ORDER BY date DESC LIMIT 50', (user_id,)).fetchall()
+    return users[0], WorkoutRecord.from_rows(workouts), DietRecord.from_rows(diets)
+
+
+def fit_user_models(db_config, user_id):
+    """
+    Train one user's models (runs inside a worker process)
+    Returns:
+        (user_id, fingerprint, state) where state is None if there is not enough data
+    """
+    conn = connect(db_config)
+    try:
+        user_dict, workout_list, diet_list = load_training_data(conn, user_id)
+        if user_dict is None:
+            return user_id, None, None
+        fingerprint = data_fingerprint(conn, user_id, user_dict)
+    finally:
+        conn.close()
+
+    if len(workout_list) < 3:
+        return user_id, fingerprint, None
+    recommender = FitnessRecommender()
+    if not recommender.train_models(workout_list, diet_list, user_dict):
+        return user_id, fingerprint, None
+    return user_id, fingerprint, recommender.export_state()
+
+
+class TrainingQueue:
+    """
+    Deduplicating queue of users whose models need refitting, drained by a process pool.
+    max_workers=None uses one process per CPU; max_workers=0 disables the queue.
+    """
+
+    def __init__(self, store, db_config, max_workers=None):
+        self.store = store
+        self.db_config = db_config  # plain dict from db.config_from_env, picklable for workers
+        self.max_workers = max_workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = set()    # waiting in the queue
+        self._inflight = set()  # currently being fitted
+        self._dirty = set()     # changed again while being fitted
+        self._failed = {}       # user_id -> fingerprint that could not be trained
+        self._executor = None
+        self._dispatcher = None
+        self.trained = 0
+
+    def enqueue(self, user_id, fingerprint=None):
+        """
+        Schedule a refit for a user; cheap and safe to call from request threads
+        Args:
+            user_id: User whose workout/diet data changed
+            fingerprint: Current data fingerprint, if known, to skip data we already failed on
+        """
+        if self.max_workers == 0:
+            return
+        with self._lock:
+            if fingerprint is not None and self._failed.get(user_id) == fingerprint:
+                return
+            if user_id in self._inflight:
+                self._dirty.add(user_id)
+                return
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+            self._start()
+        self._queue.put(user_id)
+
+    def pending(self):
+        """Number of users waiting for or currently in training"""
+        with self._lock:
+            return len(self._queued) + len(self._inflight)
+
+    def _start(self):
+        # Called with self._lock held; the pool and dispatcher start on first use
+        if self._dispatcher is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._dispatcher = threading.Thread(target=self._run, name='training-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _run(self):
+        while True:
+            user_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(user_id)
+                self._inflight.add(user_id)
+            try:
+                future = self._executor.submit(fit_user_models, self.db_config, user_id)
+            except Exception as e:
+                print(f"Error scheduling training for user {user_id}: {e}")
+                self._finish(user_id)
+                continue
+            future.add_done_callback(functools.partial(self._on_done, user_id))
+
+    def _on_done(self, user_id, future):
+        try:
+            _, fingerprint, state = future.result()
+            if state is not None:
+                recommender = FitnessRecommender()
+                recommender.load_state(state)
+                self.store.put(user_id, fingerprint, recommender)
+                self.trained += 1
+            with self._lock:
+                if state is None and fingerprint is not None:
+                    self._failed[user_id] = fingerprint
+                else:
+                    self._failed.pop(user_id, None)
+        except Exception as e:
+            print(f"Error training models for user {user_id}: {e}")
+        finally:
+            self._finish(user_id)
+
+    def _finish(self, user_id):
+        with self._lock:
+            self._inflight.discard(user_id)
+            again = user_id in self._dirty
+            self._dirty.discard(user_id)
+        if again:
+            self.enqueue(user_id)
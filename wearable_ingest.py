@@ -0,0 +1,130 @@
+"""
+Wearable Data Ingestion
+Validates wearable readings and stores them in bulk. Used both by the single
+reading form on /wearable and by the batch endpoint devices sync through.
+sleep_hours is the whole of the previous night's sleep, repeated on every
+reading of the day (as the /wearable form sends it); the daily rollup keeps the
+largest value. Devices that report a night in segments must send the summed
+night, or it is under-counted.
+"""
+import json
+from datetime import datetime
+
+import rollups
+
+# Formats devices and the datetime-local form input send; stored as '%Y-%m-%d %H:%M:%S'
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M')
+MAX_ERRORS_REPORTED = 20
+
+
+def _number(value, cast, name, low, high):
+    if value is None or value == '':
+        return cast(0)
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if number != 0 and not (low <= number <= high):
+        raise ValueError(f'{name} must be between {low} and {high}')
+    return number
+
+
+def parse_timestamp(value):
+    """Normalize a reading timestamp so duplicates compare equal"""
+    if isinstance(value, str):
+        value = value.strip().rstrip('Z')
+        for fmt in TIMESTAMP_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+    raise ValueError('recorded_at must look like YYYY-MM-DD HH:MM[:SS]')
+
+
+def parse_reading(record):
+    """
+    Validate one reading
+    Args:
+        record: dict with recorded_at, steps, heart_rate, sleep_hours, calories_burned
+    Returns:
+        (recorded_at, steps, heart_rate, sleep_hours, calories_burned)
+    Raises:
+        ValueError with a message suitable for the API response
+    """
+    if not isinstance(record, dict):
+        raise ValueError('reading must be an object')
+    return (
+        parse_timestamp(record.get('recorded_at')),
+        _number(record.get('steps'), int, 'steps', 0, 200000),
+        _number(record.get('heart_rate'), int, 'heart_rate', 20, 250),
+        _number(record.get('sleep_hours'), float, 'sleep_hours', 0, 24),
+        _number(record.get('calories_burned'), int, 'calories_burned', 0, 20000),
+    )
+
+
+def iter_ndjson(lines):
+    """Yield one decoded object per non-blank NDJSON line (bad lines yield the raw error)"""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError('line is not valid JSON')
+
+
+def validate_batch(records, max_rows):
+    """
+    Validate and de-duplicate a batch of raw readings
+    Args:
+        records: Iterable of dicts (or ValueError placeholders from iter_ndjson)
+        max_rows: Largest batch accepted
+    Returns:
+        (rows, stats) where rows are unique on recorded_at (the last reading wins)
+    Raises:
+        OverflowError if the batch has more than max_rows readings
+    """
+    by_timestamp = {}
+    errors = []
+    received = invalid = 0
+    for index, record in enumerate(records):
+        received += 1
+        if received > max_rows:
+            raise OverflowError(f'batch larger than {max_rows} readings')
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            row = parse_reading(record)
+        except ValueError as e:
+            invalid += 1
+            if len(errors) < MAX_ERRORS_REPORTED:
+                errors.append({'index': index, 'error': str(e)})
+            continue
+        by_timestamp[row[0]] = row
+    stats = {'received': received, 'invalid': invalid,
+             'duplicates': received - invalid - len(by_timestamp), 'errors': errors}
+    return sorted(by_timestamp.values()), stats
+
+
+def insert_readings(db, user_id, rows):
+    """
+    Insert validated readings for one user in a single transaction
+    Readings whose (user_id, recorded_at) already exists are skipped. The daily
+    and weekly rollups for the touched days are refreshed in the same transaction.
+    Returns:
+        Number of rows actually inserted
+    """
+    if not rows:
+        return 0
+    cursor = db.executemany(
+        'INSERT OR IGNORE INTO wearabled (user_id,recorded_at,steps,heart_rate,sleep_hours,calories_burned) '
+        'VALUES (?,?,?,?,?,?)',
+        [(user_id,) + row for row in rows])
+    inserted = max(cursor.rowcount, 0)
+    if inserted:
+        rollups.refresh(db, user_id, {row[0] for row in rows})
+    db.commit()
+    return inserted